@@ -0,0 +1,219 @@
+"""
+Asyncio serving mode: the same Flask app behind an ASGI event loop.
+
+    cd mockbe && uvicorn asgi:app --host 0.0.0.0 --port 8080
+
+Under gunicorn (see gunicorn.conf.py) a request holds a worker thread for
+its whole lifetime, including the time a slow client takes to send an
+upload or read a download. Here the event loop does the network I/O:
+
+  - the request body is read asynchronously into a spool (memory for small
+    bodies, a temp file in the blob store's tmp dir otherwise) before the
+    route runs, so a route never waits on the client
+  - routes run unchanged on a small thread pool, so validate_file_access,
+    locking and every JSON response behave exactly as under WSGI
+  - the response body is pulled one chunk at a time on the pool and each
+    chunk is awaited onto the socket; the server's flow control suspends a
+    slow reader's transfer instead of buffering it, so it holds an open
+    file and one chunk of memory but no thread
+
+State is per process, so this also runs as a single process.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.wsgi import FileWrapper
+
+import server
+
+# Threads running routes and reading response chunks; transfers only hold
+# one while a chunk is being produced
+ASYNC_THREADS = int(os.environ.get("ASYNC_THREADS", 32))
+# Size of the chunks file responses are read and sent in
+TRANSFER_CHUNK_KB = int(os.environ.get("TRANSFER_CHUNK_KB", 256))
+# Request bodies up to this size are spooled in memory, larger ones on disk
+BODY_MEMORY_KB = int(os.environ.get("BODY_MEMORY_KB", 1024))
+
+
+class AsyncWSGIApp:
+    """
+    ASGI application serving a WSGI app without tying a thread to the
+    client's connection.
+
+    ``max_body()`` bounds how much of a request body is spooled. Past it the
+    body is not read any further and the app is called with the observed
+    Content-Length and only the bytes received, so its own size check
+    answers (413 for uploads).
+    """
+
+    def __init__(
+        self,
+        wsgi_app,
+        max_body,
+        spool_dir: str = None,
+        threads: int = 32,
+        chunk_size: int = 256 * 1024,
+        body_memory_bytes: int = 1024 * 1024,
+    ):
+        self.wsgi_app = wsgi_app
+        self.max_body = max_body
+        self.spool_dir = spool_dir
+        self.chunk_size = chunk_size
+        self.body_memory_bytes = body_memory_bytes
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix="asgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        body = tempfile.SpooledTemporaryFile(
+            max_size=self.body_memory_bytes, dir=self.spool_dir
+        )
+        try:
+            content_length = await self._read_body(scope, receive, body)
+            if content_length is None:
+                return  # client went away before the body was complete
+            body.seek(0)
+            await self._respond(self._environ(scope, body, content_length), receive, send)
+        finally:
+            body.close()
+
+    async def _read_body(self, scope, receive, body) -> int | None:
+        limit = self.max_body()
+        declared = None
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit():
+                declared = int(value)
+        if declared is not None and declared > limit:
+            return declared
+
+        loop = asyncio.get_running_loop()
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunk = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            size += len(chunk)
+            if size > limit:
+                return size
+            if size > self.body_memory_bytes:
+                # Spilled to disk: keep file writes off the event loop
+                await loop.run_in_executor(self.pool, body.write, chunk)
+            else:
+                body.write(chunk)
+        return size
+
+    async def _respond(self, environ: dict, receive, send):
+        loop = asyncio.get_running_loop()
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [int(status.split(" ", 1)[0]), headers]
+
+        iterable = await loop.run_in_executor(
+            self.pool, self.wsgi_app, environ, start_response
+        )
+        disconnected = asyncio.Event()
+        watcher = loop.create_task(self._watch_disconnect(receive, disconnected))
+        try:
+            chunks = iter(iterable)
+            # start_response may be deferred until the first chunk
+            chunk = await loop.run_in_executor(self.pool, next, chunks, None)
+            status, headers = started
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": status,
+                    # The server sends its own Date; werkzeug's conditional
+                    # responses would add a second one
+                    "headers": [
+                        (name.lower().encode("latin-1"), value.encode("latin-1"))
+                        for name, value in headers
+                        if name.lower() != "date"
+                    ],
+                }
+            )
+            while chunk is not None and not disconnected.is_set():
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await loop.run_in_executor(self.pool, next, chunks, None)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            watcher.cancel()
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                await loop.run_in_executor(self.pool, close)
+
+    def _environ(self, scope, body, content_length: int) -> dict:
+        server_name, server_port = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope["query_string"].decode("latin-1"),
+            "SERVER_NAME": server_name,
+            "SERVER_PORT": str(server_port),
+            "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+            "CONTENT_LENGTH": str(content_length),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": body,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+            # send_file hands files to this; read them in large chunks
+            "wsgi.file_wrapper": lambda fh, buffer_size=0: FileWrapper(fh, self.chunk_size),
+        }
+        if scope.get("client"):
+            host, port = scope["client"]
+            environ["REMOTE_ADDR"] = host
+            environ["REMOTE_PORT"] = str(port)
+        for name, value in scope["headers"]:
+            name = name.decode("latin-1").upper().replace("-", "_")
+            if name == "CONTENT_LENGTH":
+                continue
+            if name != "CONTENT_TYPE":
+                name = f"HTTP_{name}"
+            value = value.decode("latin-1")
+            environ[name] = f"{environ[name]},{value}" if name in environ else value
+        return environ
+
+    async def _watch_disconnect(self, receive, disconnected: asyncio.Event):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.pool.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def max_request_body() -> int:
+    return server.policy.get("maxFileSizeMB", 50) * 1024 * 1024 + server.MULTIPART_OVERHEAD_BYTES
+
+
+app = AsyncWSGIApp(
+    server.app,
+    max_request_body,
+    spool_dir=server.blob_store.tmp_dir,
+    threads=ASYNC_THREADS,
+    chunk_size=TRANSFER_CHUNK_KB * 1024,
+    body_memory_bytes=BODY_MEMORY_KB * 1024,
+)
@@ -0,0 +1,402 @@
+"""
+Load-test and benchmark suite for the API.
+
+Each scenario runs in a fresh server process with its own empty STORAGE_DIR,
+seeds the state it needs, then drives the Flask app through its test client
+and times every request (the app's own cost, without a network in between):
+
+  auth_register    POST /api/auth/register with new users
+  auth_login       POST /api/auth/login
+  auth_totp_login  POST /api/auth/login + /api/auth/login/totp for a TOTP user
+  upload_<size>    POST /api/files/upload of a file of that size
+  files_my         GET /api/files/my, random pages, for a user with many files
+  files_available  GET /api/files/available, random pages, over a big store
+  download_hot     GET /api/files/<token>/download, all on one share token
+  cleanup          POST /api/admin/cleanup with many expired files each round
+
+Each scenario is run --repeat times and the fastest run is kept, as timeit
+does, to filter out noise from the rest of the machine. Reports
+requests/sec and p50/p95/p99 latency per scenario, writes them as JSON
+(--output), and compares them with a stored baseline (--baseline) taken
+with the same workload options: a scenario regresses when its requests/sec
+drops, or its p95 grows, by more than --tolerance. Exits 1 on any
+regression.
+
+    cd mockbe && python -m benchmarks.api_bench
+    cd mockbe && python -m benchmarks.api_bench --scenarios files_my cleanup --user-files 50000
+    cd mockbe && python -m benchmarks.api_bench --save-baseline
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+MOCKBE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(MOCKBE_DIR, "benchmarks", "api_baseline.json")
+
+ADMIN = {"email": "jitensha@hcmut.edu.vn", "password": "jitensha@123"}
+OWNER = {"email": "bigbluewhale@hcmut.edu.vn", "password": "bigbluewhale@123"}
+
+SCENARIOS = (
+    "auth_register",
+    "auth_login",
+    "auth_totp_login",
+    "upload",
+    "files_my",
+    "files_available",
+    "download_hot",
+    "cleanup",
+)
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies: list, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "rps": len(ordered) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+    }
+
+
+# Scenario bodies run in the child process, which imports the server.
+
+
+class Driver:
+    def __init__(self):
+        import server
+
+        self.server = server
+        self.client = server.app.test_client()
+
+    def request(self, method: str, path: str, expect: int = 200, **kwargs):
+        response = self.client.open(path, method=method, **kwargs)
+        if response.status_code != expect:
+            raise RuntimeError(
+                f"{method} {path}: {response.status_code} (expected {expect}) "
+                f"{response.get_data(as_text=True)[:200]}"
+            )
+        return response
+
+    def login(self, credentials: dict) -> dict:
+        token = self.request("POST", "/api/auth/login", json=credentials).get_json()["accessToken"]
+        return {"Authorization": f"Bearer {token}"}
+
+    def seed_files(self, owner_email: str, count: int, available_from: float, available_to: float):
+        """
+        Add ``count`` public files sharing one blob straight to the store,
+        the way create_file_record() would.
+        """
+        from records import FileRecord
+
+        server = self.server
+        spool = server.blob_store.spool()
+        spool.write(b"benchmark")
+        key = server.blob_store.commit(spool)
+        owner = server.users[owner_email]
+        now = time.time()
+        with server.state_lock:
+            for i in range(count):
+                server.blob_store.add_ref(key)
+                server.add_file_record(
+                    FileRecord(
+                        id=str(uuid.uuid4()),
+                        filename=f"seed-{i}.bin",
+                        size=9,
+                        mime_type="application/octet-stream",
+                        owner=owner,
+                        is_public=True,
+                        password=None,
+                        available_from=available_from,
+                        available_to=available_to,
+                        shared_with=(),
+                        created_at=now - count + i,
+                        sha256=key,
+                    )
+                )
+            server.blob_store.release(key)
+
+    def measure(self, op, count: int, warmup: int = 0) -> dict:
+        for i in range(warmup):
+            op(i)
+        latencies = []
+        started = time.perf_counter()
+        for i in range(warmup, warmup + count):
+            t0 = time.perf_counter()
+            op(i)
+            latencies.append(time.perf_counter() - t0)
+        return summarize(latencies, time.perf_counter() - started)
+
+
+def run_auth_register(d: Driver, args) -> dict:
+    prefix = uuid.uuid4().hex[:8]
+
+    def op(i):
+        d.request(
+            "POST",
+            "/api/auth/register",
+            json={"username": f"{prefix}-{i}", "email": f"{prefix}-{i}@bench", "password": "p"},
+        )
+
+    return d.measure(op, args.requests)
+
+
+def run_auth_login(d: Driver, args) -> dict:
+    return d.measure(lambda i: d.request("POST", "/api/auth/login", json=OWNER), args.requests, warmup=50)
+
+
+def run_auth_totp_login(d: Driver, args) -> dict:
+    credentials = {"email": "totp@bench", "password": "p"}
+    d.request("POST", "/api/auth/register", json={"username": "totp", **credentials})
+    headers = d.login(credentials)
+    d.request("POST", "/api/auth/totp/setup", headers=headers)
+    d.request("POST", "/api/auth/totp/verify", headers=headers, json={"code": d.server.MOCK_TOTP_CODE})
+
+    def op(i):
+        cid = d.request("POST", "/api/auth/login", json=credentials).get_json()["cid"]
+        d.request("POST", "/api/auth/login/totp", json={"cid": cid, "code": d.server.MOCK_TOTP_CODE})
+
+    return d.measure(op, args.requests, warmup=50)
+
+
+def run_upload(d: Driver, args, size: int) -> dict:
+    headers = d.login(OWNER)
+    # Distinct contents per request, so every upload writes a new blob
+    payload = os.urandom(size)
+    count = max(10, min(args.requests, (256 << 20) // max(size, 1)))
+
+    def op(i):
+        body = i.to_bytes(8, "big") + payload[8:]
+        d.request(
+            "POST",
+            "/api/files/upload",
+            expect=201,
+            headers=headers,
+            data={"file": (io.BytesIO(body), f"bench-{i}.bin"), "isPublic": "true"},
+            content_type="multipart/form-data",
+        )
+
+    return d.measure(op, count, warmup=2)
+
+
+def run_files_my(d: Driver, args) -> dict:
+    now = time.time()
+    d.seed_files(OWNER["email"], args.user_files, now - 3600, now + 86400)
+    headers = d.login(OWNER)
+    rng = random.Random(1)
+    pages = max(1, args.user_files // 20)
+
+    def op(i):
+        d.request("GET", f"/api/files/my?page={rng.randint(1, pages)}&limit=20", headers=headers)
+
+    return d.measure(op, args.requests, warmup=20)
+
+
+def run_files_available(d: Driver, args) -> dict:
+    now = time.time()
+    d.seed_files(OWNER["email"], args.store_files, now - 3600, now + 86400)
+    rng = random.Random(1)
+    pages = max(1, args.store_files // 10)
+
+    def op(i):
+        d.request("GET", f"/api/files/available?page={rng.randint(1, pages)}&limit=10")
+
+    return d.measure(op, args.requests, warmup=20)
+
+
+def run_download_hot(d: Driver, args) -> dict:
+    headers = d.login(OWNER)
+    file_id = d.request(
+        "POST",
+        "/api/files/upload",
+        expect=201,
+        headers=headers,
+        data={"file": (io.BytesIO(os.urandom(64 * 1024)), "hot.bin"), "isPublic": "true"},
+        content_type="multipart/form-data",
+    ).get_json()["file"]["id"]
+
+    def op(i):
+        d.request("GET", f"/api/files/{file_id}/download", headers=headers).close()
+
+    return d.measure(op, args.requests, warmup=50)
+
+
+def run_cleanup(d: Driver, args) -> dict:
+    headers = d.login(ADMIN)
+    now = time.time()
+    # Live files that cleanup must leave alone
+    d.seed_files(OWNER["email"], args.expired_files, now - 3600, now + 86400)
+    latencies = []
+    elapsed = 0.0
+    for _ in range(args.cleanup_rounds):
+        d.seed_files(OWNER["email"], args.expired_files, now - 7200, now - 3600)
+        t0 = time.perf_counter()
+        deleted = d.request("POST", "/api/admin/cleanup", headers=headers).get_json()["deletedFiles"]
+        latencies.append(time.perf_counter() - t0)
+        elapsed += latencies[-1]
+        if deleted != args.expired_files:
+            raise RuntimeError(f"cleanup deleted {deleted} of {args.expired_files} files")
+    return summarize(latencies, elapsed)
+
+
+def run_child(scenario: str, args) -> dict:
+    d = Driver()
+    if scenario.startswith("upload_"):
+        return run_upload(d, args, parse_size(scenario[len("upload_"):]))
+    return globals()[f"run_{scenario}"](d, args)
+
+
+# Parent: spawn one child per scenario, report, compare with the baseline.
+
+
+def parse_size(text: str) -> int:
+    units = {"k": 1 << 10, "m": 1 << 20, "g": 1 << 30}
+    text = text.lower().rstrip("ib")
+    if text and text[-1] in units:
+        return int(text[:-1]) * units[text[-1]]
+    return int(text)
+
+
+def expand_scenarios(names: list, upload_sizes: list) -> list:
+    expanded = []
+    for name in names:
+        if name == "upload":
+            expanded.extend(f"upload_{size}" for size in upload_sizes)
+        else:
+            expanded.append(name)
+    return expanded
+
+
+def spawn(scenario: str, argv: list) -> dict:
+    with tempfile.TemporaryDirectory() as storage_dir:
+        env = dict(os.environ, STORAGE_DIR=storage_dir, STATE_BACKEND="memory")
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.api_bench", *argv, "--child", scenario],
+            cwd=MOCKBE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{scenario} failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Returns [(scenario, message)] for every regression against the baseline.
+    """
+    regressions = []
+    for scenario, result in results.items():
+        base = baseline.get(scenario)
+        if not base:
+            continue
+        if result["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(
+                (scenario, f"rps {result['rps']:,.0f} vs baseline {base['rps']:,.0f}")
+            )
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                (scenario, f"p95 {result['p95_ms']:.2f} ms vs baseline {base['p95_ms']:.2f} ms")
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=2000, help="timed requests per scenario")
+    parser.add_argument("--upload-sizes", nargs="+", default=["1k", "1m", "16m"])
+    parser.add_argument("--user-files", type=int, default=20000, help="files of the files_my user")
+    parser.add_argument("--store-files", type=int, default=100000, help="files for files_available")
+    parser.add_argument("--expired-files", type=int, default=10000, help="expired files per cleanup")
+    parser.add_argument("--cleanup-rounds", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario, best is kept")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args)))
+        return
+
+    # Children get the same workload options
+    child_argv = [
+        "--requests", str(args.requests),
+        "--user-files", str(args.user_files),
+        "--store-files", str(args.store_files),
+        "--expired-files", str(args.expired_files),
+        "--cleanup-rounds", str(args.cleanup_rounds),
+    ]
+    scenarios = expand_scenarios(args.scenarios, args.upload_sizes)
+
+    options = dict(zip(child_argv[::2], child_argv[1::2]))
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as fh:
+            stored = json.load(fh)
+        if stored["meta"]["options"] == options:
+            baseline = stored["results"]
+        else:
+            print(f"baseline {args.baseline} used other workload options, not comparing")
+
+    results = {}
+    print(f"{'scenario':18} {'requests':>8} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for scenario in scenarios:
+        runs = [spawn(scenario, child_argv) for _ in range(args.repeat)]
+        result = results[scenario] = max(runs, key=lambda run: run["rps"])
+        line = (
+            f"{scenario:18} {result['requests']:8} {result['rps']:10,.1f}"
+            f" {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} {result['p99_ms']:9.2f}"
+        )
+        if scenario in baseline:
+            line += f"   ({result['rps'] / baseline[scenario]['rps'] - 1:+.0%} req/s vs baseline)"
+        print(line)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "options": options,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    for scenario, message in regressions:
+        print(f"REGRESSION {scenario}: {message}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
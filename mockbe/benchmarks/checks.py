@@ -0,0 +1,21 @@
+"""
+Result reporting shared by the check scripts (concurrency_stress,
+download_check, replay_check): each check prints one ok/FAIL line, and
+report() exits non-zero if any failed.
+"""
+
+import sys
+
+
+def check(failures: list, label: str, got, expected):
+    ok = got == expected
+    print(f"  {'ok  ' if ok else 'FAIL'} {label}: {got!r} (expected {expected!r})")
+    if not ok:
+        failures.append(label)
+
+
+def report(failures: list):
+    if failures:
+        print(f"{len(failures)} check(s) failed")
+        sys.exit(1)
+    print("all checks passed")
@@ -0,0 +1,207 @@
+"""
+Concurrency stress test for the backend's shared state.
+
+Serves the app from a threaded WSGI server and hammers it from many client
+threads, then checks that nothing was lost or duplicated:
+
+  - parallel downloads of a few files by several users: downloadCount,
+    history length and uniqueDownloaders must match what was sent exactly
+  - parallel registrations of the same username: exactly one succeeds
+  - parallel uploads: every file shows up once in GET /api/files/my
+  - parallel deletes: the /api/files/my summary counts every deletion, and
+    the status counters still match a full recount of the files
+
+The interpreter's thread switch interval is lowered so that races surface
+quickly. Exits non-zero on any mismatch.
+
+    cd mockbe && python -m benchmarks.concurrency_stress --threads 32 --downloads 4000
+"""
+
+import argparse
+import json
+import logging
+import sys
+import threading
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import make_server
+
+import server
+from benchmarks.checks import check, report
+
+USERS = (
+    ("jitensha@hcmut.edu.vn", "jitensha@123"),
+    ("bigbluewhale@hcmut.edu.vn", "bigbluewhale@123"),
+)
+
+
+class Client:
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def call(self, method: str, path: str, token=None, body=None, headers=None):
+        headers = dict(headers or {})
+        data = None
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        if isinstance(body, dict):
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        elif body is not None:
+            data = body
+        req = urllib.request.Request(
+            self.base_url + path, data=data, method=method, headers=headers
+        )
+        try:
+            with urllib.request.urlopen(req) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as err:
+            return err.code, err.read()
+
+    def json(self, method: str, path: str, token=None, body=None):
+        status, raw = self.call(method, path, token, body)
+        return status, json.loads(raw) if raw else None
+
+    def login(self, email: str, password: str) -> str:
+        _, data = self.json("POST", "/api/auth/login", body={"email": email, "password": password})
+        return data["accessToken"]
+
+    def upload(self, token: str, name: str) -> str:
+        boundary = uuid.uuid4().hex
+        body = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="isPublic"\r\n\r\ntrue\r\n'
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{name}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n"
+            f"{name}\r\n"
+            f"--{boundary}--\r\n"
+        ).encode()
+        status, raw = self.call(
+            "POST",
+            "/api/files/upload",
+            token,
+            body,
+            {"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        )
+        assert status == 201, raw
+        return json.loads(raw)["file"]["id"]
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--downloads", type=int, default=4000)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--registrations", type=int, default=64)
+    parser.add_argument("--uploads", type=int, default=200)
+    parser.add_argument("--deletes", type=int, default=100)
+    args = parser.parse_args()
+
+    sys.setswitchinterval(1e-6)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    httpd = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    client = Client(f"http://127.0.0.1:{httpd.server_port}")
+    failures = []
+
+    tokens = [client.login(email, password) for email, password in USERS]
+    owner = tokens[1]
+    file_ids = [client.upload(owner, f"stress-{i}.bin") for i in range(args.files)]
+
+    def download(i: int) -> int:
+        file_id = file_ids[i % len(file_ids)]
+        token = tokens[i // len(file_ids) % len(tokens)]
+        status, _ = client.call("GET", f"/api/files/{file_id}/download", token)
+        return status
+
+    with ThreadPoolExecutor(args.threads) as pool:
+        statuses = list(pool.map(download, range(args.downloads)))
+
+    print(f"downloads: {args.downloads} over {len(file_ids)} files, {args.threads} threads")
+    check(failures, "successful downloads", statuses.count(200), args.downloads)
+    for n, file_id in enumerate(file_ids):
+        expected = len(range(n, args.downloads, len(file_ids)))
+        _, stats = client.json("GET", f"/api/files/stats/{file_id}", owner)
+        _, history = client.json(
+            "GET", f"/api/files/download-history/{file_id}?limit=1", owner
+        )
+        check(failures, f"file {n} downloadCount", stats["statistics"]["downloadCount"], expected)
+        check(
+            failures,
+            f"file {n} history records",
+            history["pagination"]["totalRecords"],
+            min(expected, server.DOWNLOAD_HISTORY_MAX_ENTRIES or expected),
+        )
+        check(
+            failures,
+            f"file {n} uniqueDownloaders",
+            stats["statistics"]["uniqueDownloaders"],
+            min(expected, len(tokens)),
+        )
+
+    username = f"stress-{uuid.uuid4().hex[:8]}"
+
+    def register(i: int) -> int:
+        status, _ = client.json(
+            "POST",
+            "/api/auth/register",
+            body={"username": username, "email": f"{username}-{i}@x", "password": "p"},
+        )
+        return status
+
+    with ThreadPoolExecutor(args.threads) as pool:
+        statuses = list(pool.map(register, range(args.registrations)))
+
+    print(f"registrations: {args.registrations} of the same username")
+    check(failures, "registered", statuses.count(200), 1)
+    check(failures, "rejected as duplicate", statuses.count(409), args.registrations - 1)
+
+    uploader = tokens[0]
+    _, before = client.json("GET", "/api/files/my?limit=1", uploader)
+    with ThreadPoolExecutor(args.threads) as pool:
+        uploaded = set(pool.map(lambda i: client.upload(uploader, f"up-{i}.bin"), range(args.uploads)))
+    _, after = client.json("GET", f"/api/files/my?limit={args.uploads * 2}", uploader)
+
+    print(f"uploads: {args.uploads}")
+    check(failures, "distinct file ids", len(uploaded), args.uploads)
+    check(
+        failures,
+        "files listed",
+        after["pagination"]["totalFiles"],
+        before["pagination"]["totalFiles"] + args.uploads,
+    )
+
+    doomed = list(uploaded)[: args.deletes]
+    with ThreadPoolExecutor(args.threads) as pool:
+        statuses = list(
+            pool.map(lambda f: client.call("DELETE", f"/api/files/info/{f}", uploader)[0], doomed)
+        )
+    _, after_deletes = client.json("GET", "/api/files/my?limit=1", uploader)
+
+    print(f"deletes: {len(doomed)}")
+    check(failures, "successful deletes", statuses.count(200), len(doomed))
+    check(
+        failures,
+        "summary deletedFiles",
+        after_deletes["summary"]["deletedFiles"],
+        after["summary"]["deletedFiles"] + len(doomed),
+    )
+    check(
+        failures,
+        "summary files",
+        sum(after_deletes["summary"][key] for key in ("activeFiles", "pendingFiles", "expiredFiles")),
+        after_deletes["pagination"]["totalFiles"],
+    )
+    check(failures, "status counter mismatches", server.check_status_counters(), [])
+
+    httpd.shutdown()
+    report(failures)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Conditional and range request check for downloads and previews.
+
+Uploads a file and requests it back with the headers browsers and download
+managers send, checking status, validators and bodies:
+
+  - full body (200), one range (206), several ranges (206
+    multipart/byteranges), unsatisfiable ranges (416)
+  - If-None-Match / If-Modified-Since (304), on full and ranged requests
+  - If-Range with a matching or stale ETag or date: the range, or the whole
+    file
+  - Last-Modified is an HTTP-date and Content-Disposition names the file on
+    every 200 and 206
+  - only full downloads and ranges from byte 0 are counted as downloads
+
+The same requests are then made with ACCEL_REDIRECT_PREFIX set: responses
+hand the body to nginx with the same validators, except If-Range requests,
+which are still served here.
+
+Exits non-zero on any mismatch.
+
+    cd mockbe && python -m benchmarks.download_check
+"""
+
+import argparse
+import io
+import os
+import tempfile
+
+from werkzeug.http import http_date
+
+from benchmarks.checks import check, report
+
+EMAIL = "bigbluewhale@hcmut.edu.vn"
+PASSWORD = "bigbluewhale@123"
+CONTENTS = b"0123456789abcdefghij"
+FILENAME = "report.txt"
+
+
+def run_checks(server, failures: list):
+    client = server.app.test_client()
+    response = client.post("/api/auth/login", json={"email": EMAIL, "password": PASSWORD})
+    auth = {"Authorization": f"Bearer {response.get_json()['accessToken']}"}
+    response = client.post(
+        "/api/files/upload",
+        headers=auth,
+        data={"file": (io.BytesIO(CONTENTS), FILENAME), "isPublic": "true"},
+    )
+    file_id = response.get_json()["file"]["id"]
+    file_meta = server.files[file_id]
+    etag = f'"{file_meta.sha256}"'
+    last_modified = http_date(file_meta.created_at)
+    stale = http_date(file_meta.created_at - 3600)
+    size = len(CONTENTS)
+
+    full = client.get(f"/api/files/{file_id}/download", headers=auth)
+    disposition = full.headers.get("Content-Disposition")
+    print("full download")
+    check(failures, "status", full.status_code, 200)
+    check(failures, "body", full.get_data(), CONTENTS)
+    check(failures, "ETag", full.headers.get("ETag"), etag)
+    check(failures, "Last-Modified", full.headers.get("Last-Modified"), last_modified)
+    check(
+        failures,
+        "Content-Disposition",
+        disposition,
+        server.content_disposition(file_meta.filename, as_attachment=True),
+    )
+
+    # (label, request headers, status, body or None, counted as a download)
+    cases = [
+        ("one range", {"Range": "bytes=2-5"}, 206, CONTENTS[2:6], False),
+        ("one range from 0", {"Range": "bytes=0-3"}, 206, CONTENTS[:4], True),
+        ("suffix range", {"Range": "bytes=-4"}, 206, CONTENTS[-4:], False),
+        ("several ranges", {"Range": "bytes=0-1,4-5"}, 206, None, False),
+        ("range past the end", {"Range": f"bytes={size}-"}, 416, None, False),
+        ("ranges past the end", {"Range": f"bytes={size}-,{size + 5}-"}, 416, None, False),
+        ("If-None-Match", {"If-None-Match": etag}, 304, b"", False),
+        ("If-Modified-Since", {"If-Modified-Since": last_modified}, 304, b"", False),
+        ("If-Modified-Since stale", {"If-Modified-Since": stale}, 200, CONTENTS, True),
+        (
+            "If-None-Match with a range",
+            {"If-None-Match": etag, "Range": "bytes=2-5"},
+            304,
+            b"",
+            False,
+        ),
+        (
+            "If-None-Match with ranges",
+            {"If-None-Match": etag, "Range": "bytes=0-1,4-5"},
+            304,
+            b"",
+            False,
+        ),
+        ("If-Range ETag", {"If-Range": etag, "Range": "bytes=2-5"}, 206, CONTENTS[2:6], False),
+        ("If-Range stale ETag", {"If-Range": '"stale"', "Range": "bytes=2-5"}, 200, CONTENTS, True),
+        (
+            "If-Range date",
+            {"If-Range": last_modified, "Range": "bytes=2-5"},
+            206,
+            CONTENTS[2:6],
+            False,
+        ),
+        ("If-Range stale date", {"If-Range": stale, "Range": "bytes=2-5"}, 200, CONTENTS, True),
+        (
+            "If-Range stale ETag, ranges",
+            {"If-Range": '"stale"', "Range": "bytes=0-1,4-5"},
+            200,
+            CONTENTS,
+            True,
+        ),
+    ]
+    expected_count = 1
+    for label, headers, status, body, counted in cases:
+        response = client.get(f"/api/files/{file_id}/download", headers=dict(auth, **headers))
+        print(label)
+        check(failures, "status", response.status_code, status)
+        if body is not None:
+            check(failures, "body", response.get_data(), body)
+        got = response.headers
+        if status in (200, 206):
+            check(failures, "Last-Modified", got.get("Last-Modified"), last_modified)
+            check(failures, "Content-Disposition", got.get("Content-Disposition"), disposition)
+        if status == 416:
+            check(failures, "Content-Range", got.get("Content-Range"), f"bytes */{size}")
+        expected_count += counted
+
+    response = client.get(
+        f"/api/files/{file_id}/download", headers=dict(auth, Range="bytes=0-1,4-5")
+    )
+    body = response.get_data()
+    print("several ranges: parts")
+    check(failures, "multipart", response.mimetype, "multipart/byteranges")
+    for label, start, stop in (("first part", 0, 2), ("second part", 4, 6)):
+        part = f"Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n".encode()
+        check(failures, label, part + CONTENTS[start:stop] + b"\r\n" in body, True)
+    check(failures, "Content-Length", response.content_length, len(body))
+
+    preview = client.get(
+        f"/api/files/{file_id}/preview", headers=dict(auth, Range="bytes=0-1,4-5")
+    )
+    print("preview, several ranges")
+    check(failures, "status", preview.status_code, 206)
+    check(
+        failures,
+        "Content-Disposition inline",
+        preview.headers.get("Content-Disposition", "").startswith("inline"),
+        True,
+    )
+
+    response = client.get(f"/api/files/stats/{file_id}", headers=auth)
+    print("download count")
+    statistics = response.get_json()["statistics"]
+    check(failures, "downloadCount", statistics["downloadCount"], expected_count)
+
+
+def run_accel_checks(server, failures: list):
+    server.ACCEL_REDIRECT_PREFIX = "/_blobs/"
+    client = server.app.test_client()
+    response = client.post("/api/auth/login", json={"email": EMAIL, "password": PASSWORD})
+    auth = {"Authorization": f"Bearer {response.get_json()['accessToken']}"}
+    response = client.post(
+        "/api/files/upload",
+        headers=auth,
+        data={"file": (io.BytesIO(CONTENTS), FILENAME), "isPublic": "true"},
+    )
+    file_id = response.get_json()["file"]["id"]
+    file_meta = server.files[file_id]
+    etag = f'"{file_meta.sha256}"'
+    last_modified = http_date(file_meta.created_at)
+    location = f"/_blobs/{file_meta.sha256[:2]}/{file_meta.sha256}"
+    disposition = server.content_disposition(file_meta.filename, as_attachment=True)
+
+    # (label, request headers, status, X-Accel-Redirect, counted as a download)
+    cases = [
+        ("full download", {}, 200, location, True),
+        ("one range", {"Range": "bytes=2-5"}, 200, location, False),
+        ("one range from 0", {"Range": "bytes=0-3"}, 200, location, True),
+        ("several ranges", {"Range": "bytes=0-1,4-5"}, 200, location, False),
+        ("If-None-Match", {"If-None-Match": etag}, 304, None, False),
+        ("If-Modified-Since", {"If-Modified-Since": last_modified}, 304, None, False),
+        ("If-Range", {"If-Range": etag, "Range": "bytes=2-5"}, 206, None, False),
+    ]
+    expected_count = 0
+    for label, headers, status, accel, counted in cases:
+        response = client.get(f"/api/files/{file_id}/download", headers=dict(auth, **headers))
+        got = response.headers
+        print(f"X-Accel-Redirect, {label}")
+        check(failures, "status", response.status_code, status)
+        check(failures, "X-Accel-Redirect", got.get("X-Accel-Redirect"), accel)
+        check(failures, "ETag", got.get("ETag"), etag)
+        if status != 304:
+            check(failures, "Last-Modified", got.get("Last-Modified"), last_modified)
+            check(failures, "Content-Disposition", got.get("Content-Disposition"), disposition)
+        expected_count += counted
+
+    response = client.get(f"/api/files/stats/{file_id}", headers=auth)
+    print("X-Accel-Redirect, download count")
+    statistics = response.get_json()["statistics"]
+    check(failures, "downloadCount", statistics["downloadCount"], expected_count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as storage_dir:
+        os.environ.update(STORAGE_DIR=storage_dir, STATE_BACKEND="memory")
+        import server
+
+        run_checks(server, failures)
+        run_accel_checks(server, failures)
+
+    report(failures)
+
+
+if __name__ == "__main__":
+    main()
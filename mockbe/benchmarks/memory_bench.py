@@ -0,0 +1,129 @@
+"""
+Memory benchmark for the in-memory file store.
+
+Builds N files the way upload_file() used to (free-form dicts with a copied
+owner dict, shareLink and ISO timestamp strings) and with the slotted records,
+then reports traced bytes per file for each layout.
+
+    cd mockbe && python -m benchmarks.memory_bench --records 100000 1000000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+import uuid
+
+from counters import ExactCounter
+from downloadlog import DownloadLog
+from records import FileRecord, FileStats, UserRecord, to_iso
+
+OWNER_COUNT = 1000
+
+
+def make_owners() -> list:
+    return [
+        UserRecord(
+            id=str(uuid.uuid4()),
+            username=f"user{i}",
+            email=f"user{i}@hcmut.edu.vn",
+            password=f"user{i}@123",
+        )
+        for i in range(OWNER_COUNT)
+    ]
+
+
+def build_legacy(count: int, owners: list) -> tuple:
+    files, file_stats, download_history = {}, {}, {}
+    now = time.time()
+    for i in range(count):
+        owner = owners[i % OWNER_COUNT]
+        file_id = str(uuid.uuid4())
+        files[file_id] = {
+            "id": file_id,
+            "filename": f"report-{i}.pdf",
+            "size": 1024 + i,
+            "mimeType": "application/octet-stream",
+            "shareToken": file_id,
+            "ownerEmail": owner.email,
+            "owner": {
+                "id": owner.id,
+                "username": owner.username,
+                "email": owner.email,
+                "role": owner.role,
+                "totpEnabled": owner.totp_enabled,
+            },
+            "isPublic": True,
+            "passwordProtected": False,
+            "password": None,
+            "availableFrom": to_iso(now),
+            "availableTo": to_iso(now + 7 * 86400),
+            "sharedWith": [],
+            "shareLink": f"http://localhost:3000/f/{file_id}",
+            "createdAt": to_iso(now + i),
+            "sha256": uuid.uuid4().hex + uuid.uuid4().hex,
+        }
+        file_stats[file_id] = {
+            "downloadCount": 0,
+            "uniqueDownloaders": set(),
+            "lastDownloadedAt": None,
+        }
+        download_history[file_id] = []
+    return files, file_stats, download_history
+
+
+def build_compact(count: int, owners: list) -> tuple:
+    files, file_stats, download_history = {}, {}, {}
+    now = time.time()
+    for i in range(count):
+        file_id = str(uuid.uuid4())
+        files[file_id] = FileRecord(
+            id=file_id,
+            filename=f"report-{i}.pdf",
+            size=1024 + i,
+            mime_type="application/octet-stream",
+            owner=owners[i % OWNER_COUNT],
+            is_public=True,
+            password=None,
+            available_from=now,
+            available_to=now + 7 * 86400,
+            shared_with=(),
+            created_at=now + i,
+            sha256=uuid.uuid4().hex + uuid.uuid4().hex,
+        )
+        file_stats[file_id] = FileStats(ExactCounter())
+        download_history[file_id] = DownloadLog(file_id)
+    return files, file_stats, download_history
+
+
+def measure(build, count: int, owners: list) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = build(count, owners)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del store
+    gc.collect()
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    owners = make_owners()
+    for count in args.records:
+        legacy = measure(build_legacy, count, owners)
+        compact = measure(build_compact, count, owners)
+        print(f"records: {count:,}")
+        print(f"  dict records     {legacy / count:8.0f} bytes/file  {legacy / 2**20:9.1f} MiB")
+        print(
+            f"  slotted records  {compact / count:8.0f} bytes/file  {compact / 2**20:9.1f} MiB"
+            f"  ({legacy / compact:.1f}x smaller)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Restart benchmark for the journal storage backend.
+
+Writes a write-ahead log of N uploaded files (plus a download per file) the
+way the server journals them, then times fresh server processes:
+
+  baseline   import with STATE_BACKEND=memory (interpreter + Flask startup)
+  recovery   first start after a crash: replay the whole log, write a snapshot
+  restart    next start: load that snapshot, nothing to replay
+
+    cd mockbe && python -m benchmarks.recovery_bench --records 100000 1000000
+"""
+
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from records import FileRecord, UserRecord
+from storage import JournalStorage
+
+OWNER_COUNT = 1000
+MOCKBE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_blob(storage_dir: str) -> str:
+    # Every file shares one blob so restored records find their contents
+    content = b"benchmark"
+    key = hashlib.sha256(content).hexdigest()
+    path = os.path.join(storage_dir, "blobs", key[:2], key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fh:
+        fh.write(content)
+    return key
+
+
+def write_log(state_dir: str, count: int, blob_key: str) -> float:
+    storage = JournalStorage(state_dir, snapshot_every=count * 10)
+    _, changes = storage.load()
+    for _ in changes:
+        pass
+
+    start = time.perf_counter()
+    owners = []
+    for i in range(OWNER_COUNT):
+        owner = UserRecord(
+            id=str(uuid.uuid4()),
+            username=f"user{i}",
+            email=f"user{i}@hcmut.edu.vn",
+            password=f"user{i}@123",
+        )
+        owners.append(owner)
+        storage.append("user", owner.to_state())
+
+    now = time.time()
+    for i in range(count):
+        owner = owners[i % OWNER_COUNT]
+        file_meta = FileRecord(
+            id=str(uuid.uuid4()),
+            filename=f"report-{i}.pdf",
+            size=9,
+            mime_type="application/octet-stream",
+            owner=owner,
+            is_public=True,
+            password=None,
+            available_from=now,
+            available_to=now + 7 * 86400,
+            shared_with=(),
+            created_at=now + i * 1e-3,
+            sha256=blob_key,
+        )
+        storage.append("file", file_meta.to_state())
+        storage.append("download", [file_meta.id, now + i * 1e-3, owner.email])
+    storage.close()
+    return time.perf_counter() - start
+
+
+def start_server(env: dict) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", "import server"], cwd=MOCKBE_DIR, env=env, check=True
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    for count in args.records:
+        with tempfile.TemporaryDirectory() as storage_dir:
+            state_dir = os.path.join(storage_dir, "state")
+            env = dict(os.environ, STORAGE_DIR=storage_dir, STATE_DIR=state_dir)
+
+            write_time = write_log(state_dir, count, write_blob(storage_dir))
+            wal_bytes = os.path.getsize(os.path.join(state_dir, "wal.log"))
+            baseline = start_server(dict(env, STATE_BACKEND="memory"))
+            recovery = start_server(dict(env, STATE_BACKEND="journal"))
+            snapshot_bytes = os.path.getsize(os.path.join(state_dir, "snapshot.json"))
+            restart = start_server(dict(env, STATE_BACKEND="journal"))
+
+        changes = count * 2 + OWNER_COUNT
+        print(f"records: {count:,}")
+        print(
+            f"  journal write   {write_time:8.2f}s  {changes / write_time:10,.0f} changes/s"
+            f"  wal {wal_bytes / 2**20:8.1f} MiB"
+        )
+        print(f"  baseline start  {baseline:8.2f}s")
+        print(f"  recovery (wal)  {recovery:8.2f}s  snapshot {snapshot_bytes / 2**20:8.1f} MiB")
+        print(f"  restart (snap)  {restart:8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
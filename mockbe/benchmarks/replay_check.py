@@ -0,0 +1,202 @@
+"""
+Restart check for the journal storage backend.
+
+Makes changes through the API in one server process with
+STATE_BACKEND=journal, then restores a fresh one from the same directories
+and checks that it ended up in the same state:
+
+  - log in twice and log one session out: only the other one is valid
+    after the restart (these changes are compacted into a snapshot)
+  - replay a login from longer ago than the idle timeout: it is still
+    valid (its uses were not logged), unless past the absolute TTL
+  - upload some contents, delete that file, upload the same contents again:
+    replay releases the blob and adopts it again, and the surviving file
+    must keep it (both in the restored state and on disk)
+  - upload other contents and delete that file: its blob is removed once
+    replay is done
+
+The file changes stay in the log, so the restore replays them on top of the
+snapshot. Last, a compaction is started, more changes are logged before its
+snapshot is written, and a reload must still replay them.
+
+Exits non-zero on any mismatch.
+
+    cd mockbe && python -m benchmarks.replay_check
+"""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from benchmarks.checks import check, report
+from storage import JournalStorage
+
+EMAIL = "bigbluewhale@hcmut.edu.vn"
+PASSWORD = "bigbluewhale@123"
+CONTENTS = b"replay check contents"
+
+
+def upload(client, token: str, filename: str, contents: bytes = CONTENTS) -> str:
+    response = client.post(
+        "/api/files/upload",
+        headers={"Authorization": f"Bearer {token}"},
+        data={"file": (io.BytesIO(contents), filename), "isPublic": "true"},
+    )
+    assert response.status_code == 201, response.get_data(as_text=True)
+    return response.get_json()["file"]["id"]
+
+
+def login(client) -> str:
+    response = client.post("/api/auth/login", json={"email": EMAIL, "password": PASSWORD})
+    return response.get_json()["accessToken"]
+
+
+def log_session(server, age: float) -> str:
+    # A login from ``age`` seconds ago, as its "session" log entry
+    token = f"token-{uuid.uuid4().hex}"
+    server.journal("session", [token, EMAIL, time.time() - age])
+    return token
+
+
+def write_changes() -> dict:
+    """
+    Runs in the first server process; returns what the restored one should see.
+    """
+    import server
+
+    client = server.app.test_client()
+    token = login(client)
+    logged_out = login(client)
+    response = client.post(
+        "/api/auth/logout", headers={"Authorization": f"Bearer {logged_out}"}
+    )
+    assert response.status_code == 200, response.get_data(as_text=True)
+    # Compacted after the logout (SNAPSHOT_EVERY=3); keep the rest in the log
+    server.storage.snapshot_every = sys.maxsize
+
+    headers = {"Authorization": f"Bearer {token}"}
+
+    idle_ttl = server.SESSION_IDLE_MINUTES * 60
+    ttl = server.SESSION_TTL_HOURS * 3600
+    past_idle = log_session(server, idle_ttl + 600)
+    past_ttl = log_session(server, ttl + 600)
+
+    deleted = upload(client, token, "first.txt")
+    response = client.delete(f"/api/files/info/{deleted}", headers=headers)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    kept = upload(client, token, "second.txt")
+    orphan = upload(client, token, "third.txt", CONTENTS[::-1])
+    orphan_sha256 = server.files[orphan].sha256
+    response = client.delete(f"/api/files/info/{orphan}", headers=headers)
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+    server.storage.close()
+    return {
+        "deleted": deleted,
+        "kept": kept,
+        "sha256": server.files[kept].sha256,
+        "orphanSha256": orphan_sha256,
+        "token": token,
+        "loggedOut": logged_out,
+        "pastIdle": past_idle,
+        "pastTtl": past_ttl,
+    }
+
+
+def check_snapshot_tail(failures: list, state_dir: str):
+    storage = JournalStorage(state_dir)
+    _, changes = storage.load()
+    for _ in changes:
+        pass
+    storage.append("policy", {"before": True})
+    seq = storage.begin_snapshot()
+    storage.append("policy", {"after": True})
+    storage.flush()
+    storage.append("policy", {"buffered": True})
+    storage.write_snapshot({"policy": {"before": True}}, seq)
+    storage.append("policy", {"last": True})
+    storage.close()
+
+    state, changes = JournalStorage(state_dir).load()
+    print("changes logged while a snapshot is written")
+    check(failures, "snapshot", state, {"policy": {"before": True}})
+    check(
+        failures,
+        "replayed",
+        [data for _, data in changes],
+        [{"after": True}, {"buffered": True}, {"last": True}],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--write", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.write:
+        print(json.dumps(write_changes()))
+        return
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        os.environ.update(
+            STORAGE_DIR=storage_dir,
+            STATE_DIR=os.path.join(storage_dir, "state"),
+            STATE_BACKEND="journal",
+            SNAPSHOT_EVERY="3",
+        )
+        written = subprocess.run(
+            [sys.executable, "-m", "benchmarks.replay_check", "--write"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        expected = json.loads(written.stdout.splitlines()[-1])
+
+        # Restore from the log the first process left behind
+        import server
+
+        failures = []
+        client = server.app.test_client()
+        print("sessions: logged in, logged out and replayed, restart")
+        for label, token, status in (
+            ("session", expected["token"], 200),
+            ("logged out session", expected["loggedOut"], 401),
+            ("session logged in before the idle timeout", expected["pastIdle"], 200),
+            ("session logged in before the TTL", expected["pastTtl"], 401),
+        ):
+            response = client.get("/api/user", headers={"Authorization": f"Bearer {token}"})
+            check(failures, label, response.status_code, status)
+
+        print("upload, delete, upload the same contents, restart")
+        check(failures, "deleted file restored", expected["deleted"] in server.files, False)
+        check(failures, "kept file restored", expected["kept"] in server.files, True)
+        check(
+            failures,
+            "blob on disk",
+            os.path.exists(server.blob_store.path(expected["sha256"])),
+            True,
+        )
+        check(failures, "blob references", server.blob_store.refs.get(expected["sha256"]), 1)
+        check(
+            failures,
+            "unreferenced blob on disk",
+            os.path.exists(server.blob_store.path(expected["orphanSha256"])),
+            False,
+        )
+
+        server.storage.close()
+
+        check_snapshot_tail(failures, os.path.join(storage_dir, "tail"))
+
+    report(failures)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Slow-client benchmark: threaded gunicorn vs the asyncio serving mode (asgi.py).
+
+Starts the server in each mode with the same number of threads, uploads one
+large file, then opens many downloads that read it very slowly and, while
+they are in flight, times small JSON requests. With threads, each slow
+download pins a thread and the JSON requests queue behind them; in asyncio
+mode slow downloads only hold a socket.
+
+    cd mockbe && python -m benchmarks.slow_clients --slow 200 --threads 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+MOCKBE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN = ("jitensha@hcmut.edu.vn", "jitensha@123")
+
+
+def start_server(mode: str, port: int, threads: int, storage_dir: str):
+    env = dict(os.environ, STORAGE_DIR=storage_dir, PORT=str(port))
+    if mode == "threads":
+        env["WEB_THREADS"] = str(threads)
+        cmd = [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "server:app"]
+    else:
+        env["ASYNC_THREADS"] = str(threads)
+        cmd = [
+            sys.executable, "-m", "uvicorn", "asgi:app",
+            "--port", str(port), "--log-level", "warning",
+        ]
+    proc = subprocess.Popen(
+        cmd, cwd=MOCKBE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/admin/policy", timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def call(base: str, method: str, path: str, token=None, body=None, timeout=30):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    if isinstance(body, dict):
+        body = json.dumps(body).encode()
+        headers["Content-Type"] = "application/json"
+    req = urllib.request.Request(base + path, data=body, method=method, headers=headers)
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read() or b"null")
+
+
+def upload_large_file(base: str, token: str, size: int) -> str:
+    upload = call(base, "POST", "/api/files/uploads", token, {"fileName": "big.bin", "isPublic": True})
+    upload_id = upload["upload"]["uploadId"]
+    call(base, "PUT", f"/api/files/uploads/{upload_id}/parts/1", token, os.urandom(size))
+    return call(base, "POST", f"/api/files/uploads/{upload_id}/complete", token)["file"]["id"]
+
+
+async def slow_download(port: int, file_id: str, token: str, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    sock = socket.socket()
+    # Small receive buffer so the server cannot park the file in the kernel
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 16 * 1024)
+    sock.setblocking(False)
+    await loop.sock_connect(sock, ("127.0.0.1", port))
+    reader, writer = await asyncio.open_connection(sock=sock)
+    writer.write(
+        f"GET /api/files/{file_id}/download HTTP/1.1\r\nHost: bench\r\n"
+        f"Authorization: Bearer {token}\r\n\r\n".encode()
+    )
+    try:
+        while not stop.is_set():
+            if not await reader.read(4096):
+                break
+            await asyncio.sleep(0.1)
+    finally:
+        writer.close()
+
+
+def probe(base: str, timeout: float):
+    start = time.perf_counter()
+    try:
+        call(base, "GET", "/api/admin/policy", timeout=timeout)
+    except (OSError, urllib.error.URLError):
+        return None
+    return time.perf_counter() - start
+
+
+async def run_mode(mode: str, args) -> dict:
+    port = args.port
+    with tempfile.TemporaryDirectory() as storage_dir:
+        proc = start_server(mode, port, args.threads, storage_dir)
+        try:
+            base = f"http://127.0.0.1:{port}"
+            token = call(base, "POST", "/api/auth/login", body=dict(zip(("email", "password"), ADMIN)))[
+                "accessToken"
+            ]
+            file_id = upload_large_file(base, token, args.file_mb * 2**20)
+
+            stop = asyncio.Event()
+            downloads = [
+                asyncio.create_task(slow_download(port, file_id, token, stop))
+                for _ in range(args.slow)
+            ]
+            await asyncio.sleep(1)
+
+            latencies = []
+            deadline = time.monotonic() + args.seconds
+            while time.monotonic() < deadline:
+                latencies.append(await asyncio.to_thread(probe, base, args.probe_timeout))
+            stop.set()
+            await asyncio.gather(*downloads, return_exceptions=True)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    answered = sorted(t for t in latencies if t is not None)
+    return {
+        "probes": len(latencies),
+        "timeouts": len(latencies) - len(answered),
+        "p50": statistics.median(answered) if answered else None,
+        "max": answered[-1] if answered else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--slow", type=int, default=200, help="concurrent slow downloads")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--file-mb", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--probe-timeout", type=float, default=2)
+    parser.add_argument("--port", type=int, default=18081)
+    parser.add_argument("--modes", nargs="+", default=["threads", "asyncio"])
+    args = parser.parse_args()
+
+    print(f"{args.slow} slow downloads of {args.file_mb} MiB, {args.threads} threads")
+    for mode in args.modes:
+        result = asyncio.run(run_mode(mode, args))
+        fmt = lambda t: "   -   " if t is None else f"{t * 1000:7.1f}"
+        print(
+            f"  {mode:8} probes {result['probes']:5}  timeouts {result['timeouts']:5}"
+            f"  p50 {fmt(result['p50'])} ms  max {fmt(result['max'])} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
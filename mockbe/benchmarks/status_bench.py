@@ -0,0 +1,92 @@
+"""
+Micro-benchmark for file status evaluation.
+
+Compares the old per-call ISO parsing against status computed from epoch
+timestamps, one record at a time and batched against a single ``now``.
+
+    cd mockbe && python -m benchmarks.status_bench --records 1000000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from records import classify_status, classify_statuses, to_iso
+
+
+def make_records(count: int, now: float) -> list:
+    # Boundaries are kept an hour away from ``now`` so every implementation
+    # sees the same statuses while the benchmark runs
+    rng = random.Random(42)
+    records = []
+    while len(records) < count:
+        available_from = now + rng.uniform(-30, 2) * 86400
+        available_to = available_from + rng.uniform(1 / 24, 30) * 86400
+        if abs(available_from - now) < 3600 or abs(available_to - now) < 3600:
+            continue
+        # Only the two fields classify_statuses() reads from a FileRecord
+        records.append(
+            SimpleNamespace(available_from=available_from, available_to=available_to)
+        )
+    return records
+
+
+def legacy_status(file_meta: dict) -> str:
+    # Previous get_file_status(): parse ISO strings on every call
+    now = datetime.now(timezone.utc)
+    available_from = datetime.fromisoformat(
+        file_meta["availableFrom"].replace("Z", "+00:00")
+    )
+    available_to = datetime.fromisoformat(file_meta["availableTo"].replace("Z", "+00:00"))
+    if now < available_from:
+        return "pending"
+    if now > available_to:
+        return "expired"
+    return "active"
+
+
+def timed(fn) -> tuple:
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    now = time.time()
+    records = make_records(args.records, now)
+    iso_records = [
+        {"availableFrom": to_iso(r.available_from), "availableTo": to_iso(r.available_to)}
+        for r in records
+    ]
+
+    legacy_time, legacy = timed(lambda: [legacy_status(r) for r in iso_records])
+    single_time, single = timed(
+        lambda: [
+            classify_status(r.available_from, r.available_to, time.time())
+            for r in records
+        ]
+    )
+    batch_time, batch = timed(lambda: classify_statuses(records, time.time()))
+
+    assert legacy == single == batch, "status mismatch between implementations"
+
+    print(f"records: {args.records:,}")
+    for name, elapsed in (
+        ("iso parse per call", legacy_time),
+        ("epoch per call", single_time),
+        ("epoch batched", batch_time),
+    ):
+        print(
+            f"{name:<20} {elapsed:8.3f}s  {elapsed / args.records * 1e9:8.1f} ns/record"
+            f"  {legacy_time / elapsed:6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
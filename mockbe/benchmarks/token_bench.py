@@ -0,0 +1,80 @@
+"""
+Token verification benchmark: signed tokens vs session lookups.
+
+Times, per call, resolving a bearer token the ways the backend can:
+
+  - a plain dict lookup (the original sessions map)
+  - SessionStore.get() (TOKEN_FORMAT=session: lock, expiry checks, LRU move)
+  - TokenSigner.verify() plus the revocation check (TOKEN_FORMAT=signed)
+
+and then get_current_user() end to end in a request context for both
+formats. The session store and revocation list are filled with --sessions
+and --revoked entries first, so lookups run against realistically sized
+tables.
+
+    cd mockbe && python -m benchmarks.token_bench --sessions 100000 --revoked 1000
+"""
+
+import argparse
+import time
+import timeit
+import uuid
+
+from sessionstore import SessionStore
+from tokens import RevocationList, TokenSigner
+
+EMAIL = "bigbluewhale@hcmut.edu.vn"
+
+
+def per_call_ns(stmt, number: int) -> float:
+    # Best of 5 runs, as timeit's command line does
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--revoked", type=int, default=1000)
+    parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    plain = {}
+    store = SessionStore(ttl=86400, idle_ttl=7200, max_entries=args.sessions + 1)
+    for _ in range(args.sessions):
+        token = f"token-{uuid.uuid4().hex}"
+        plain[token] = EMAIL
+        store.set(token, EMAIL)
+    session_token = next(reversed(plain))
+
+    signer = TokenSigner({"k2": "new-secret", "k1": "old-secret"}, "k2")
+    revoked = RevocationList()
+    for _ in range(args.revoked):
+        revoked.revoke(uuid.uuid4().hex, time.time() + 3600)
+    signed_token = signer.sign("access", 3600, sub=str(uuid.uuid4()), email=EMAIL, role="user")
+
+    def verify_signed():
+        claims = signer.verify(signed_token, "access")
+        return claims is not None and claims["jti"] not in revoked
+
+    print(f"{args.sessions:,} sessions, {args.revoked:,} revoked tokens")
+    print(f"  dict lookup              {per_call_ns(lambda: plain.get(session_token), args.number):8.0f} ns")
+    print(f"  SessionStore.get         {per_call_ns(lambda: store.get(session_token), args.number):8.0f} ns")
+    print(f"  signed verify + revoked  {per_call_ns(verify_signed, args.number):8.0f} ns")
+
+    # End to end through get_current_user(), the way every route calls it
+    import server
+
+    server.sessions[session_token] = EMAIL
+    server_signed = server.token_signer.sign(
+        "access", 3600, sub=server.users[EMAIL].id, email=EMAIL, role="user"
+    )
+    number = max(1, args.number // 10)
+    for label, token in (("session", session_token), ("signed", server_signed)):
+        with server.app.test_request_context(headers={"Authorization": f"Bearer {token}"}):
+            assert server.get_current_user()[1] is not None
+            ns = per_call_ns(server.get_current_user, number)
+        print(f"  get_current_user {label:8}{ns:8.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
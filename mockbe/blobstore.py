@@ -0,0 +1,249 @@
+import hashlib
+import os
+import shutil
+import uuid
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+
+class UploadTooLarge(RequestEntityTooLarge):
+    """
+    Raised while streaming an upload once it grows past the allowed size.
+    Subclasses werkzeug's 413 so the form parser does not swallow it.
+    """
+
+
+class SpoolFile:
+    """
+    Writable file object handed to the multipart parser.
+    Writes go straight to disk and the running size is checked on every chunk.
+    A SHA-256 of the contents is computed along the way.
+    """
+
+    def __init__(self, directory: str, max_bytes: int | None = None):
+        self.path = os.path.join(directory, f"{uuid.uuid4().hex}.part")
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._fh = open(self.path, "w+b")
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise UploadTooLarge()
+        self._hash.update(data)
+        return self._fh.write(data)
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def __getattr__(self, name):
+        # read/seek/tell/close etc. are served by the underlying file
+        return getattr(self._fh, name)
+
+
+class BlobStore:
+    """
+    Content-addressed store for uploaded file contents.
+
+    Each distinct content is kept once on disk, keyed by its SHA-256, and
+    reference counted: every file record pointing at a blob holds one
+    reference and the blob is removed when the last one is released.
+
+    Layout under ``root``:
+      tmp/<random>.part        uploads still being streamed
+      blobs/<ab>/<sha256>      committed contents, fanned out by hash prefix
+      uploads/<upload_id>/<n>  parts of a resumable upload session
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.blobs_dir = os.path.join(root, "blobs")
+        self.uploads_dir = os.path.join(root, "uploads")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.uploads_dir, exist_ok=True)
+
+        # refs[sha256] = number of file records using the blob
+        self.refs = {}
+        # sizes[sha256] = size of the blob in bytes
+        self.sizes = {}
+        self.logical_bytes = 0
+        self.physical_bytes = 0
+        # Keys released to zero references while unlinks are deferred
+        self._unreferenced = None
+
+    def spool(self, max_bytes: int | None = None) -> SpoolFile:
+        return SpoolFile(self.tmp_dir, max_bytes)
+
+    def spool_stream(self, stream, max_bytes: int | None = None) -> SpoolFile:
+        """
+        Copy a raw request body into a new spool file chunk by chunk.
+        Raises UploadTooLarge (after removing the spool) once ``max_bytes`` is passed.
+        """
+        spool = self.spool(max_bytes)
+        try:
+            while True:
+                chunk = stream.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                spool.write(chunk)
+        except BaseException:
+            self.discard(spool)
+            raise
+        spool.flush()
+        return spool
+
+    def commit(self, spool: SpoolFile) -> str:
+        """
+        Store a finished spool file and take a reference on its blob.
+        If the same content is already stored, the spool is dropped instead.
+        Returns the blob key (SHA-256 hex digest).
+        """
+        spool.flush()
+        spool.close()
+        key = spool.sha256
+
+        if key in self.refs:
+            self.discard(spool)
+        else:
+            path = self.path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(spool.path, path)
+            self.refs[key] = 0
+            self.sizes[key] = spool.size
+            self.physical_bytes += spool.size
+
+        self.add_ref(key)
+        return key
+
+    def adopt(self, key: str) -> bool:
+        """
+        Take a reference on a blob already on disk, for file records restored
+        after a restart. Returns False if the blob is missing.
+        """
+        if key not in self.refs:
+            try:
+                size = os.path.getsize(self.path(key))
+            except FileNotFoundError:
+                return False
+            self.refs[key] = 0
+            self.sizes[key] = size
+            self.physical_bytes += size
+
+        self.add_ref(key)
+        return True
+
+    def add_ref(self, key: str):
+        self.refs[key] += 1
+        self.logical_bytes += self.sizes[key]
+
+    def release(self, key: str):
+        """
+        Drop one reference; the blob is deleted when none are left.
+        """
+        if key not in self.refs:
+            return
+
+        size = self.sizes[key]
+        self.refs[key] -= 1
+        self.logical_bytes -= size
+        if self.refs[key] > 0:
+            return
+
+        del self.refs[key]
+        del self.sizes[key]
+        self.physical_bytes -= size
+        if self._unreferenced is not None:
+            self._unreferenced.add(key)
+            return
+        self._unlink(key)
+
+    def defer_unlinks(self):
+        """
+        Keep blobs on disk when their last reference is released, until
+        sweep(). While a log is replayed, a blob released by one entry may
+        be adopted again by a later one.
+        """
+        if self._unreferenced is None:
+            self._unreferenced = set()
+
+    def sweep(self) -> int:
+        """
+        Delete the blobs released since defer_unlinks() that are still
+        unreferenced, and stop deferring. Returns how many were deleted.
+        """
+        unreferenced, self._unreferenced = self._unreferenced or set(), None
+        swept = 0
+        for key in unreferenced:
+            if key not in self.refs:
+                self._unlink(key)
+                swept += 1
+        return swept
+
+    def _unlink(self, key: str):
+        try:
+            os.unlink(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def discard(self, spool: SpoolFile):
+        if not spool.closed:
+            spool.close()
+        try:
+            os.unlink(spool.path)
+        except FileNotFoundError:
+            pass
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.blobs_dir, key[:2], key)
+
+    def usage(self) -> dict:
+        return {
+            "blobCount": len(self.refs),
+            "references": sum(self.refs.values()),
+            "logicalBytes": self.logical_bytes,
+            "physicalBytes": self.physical_bytes,
+        }
+
+    # Resumable upload parts
+
+    def part_path(self, upload_id: str, part_number: int) -> str:
+        return os.path.join(self.uploads_dir, upload_id, str(part_number))
+
+    def commit_part(self, spool: SpoolFile, upload_id: str, part_number: int) -> str:
+        """
+        Store a part, replacing any earlier copy of the same part number.
+        """
+        spool.flush()
+        spool.close()
+        os.makedirs(os.path.join(self.uploads_dir, upload_id), exist_ok=True)
+        path = self.part_path(upload_id, part_number)
+        os.replace(spool.path, path)
+        return path
+
+    def assemble_parts(self, upload_id: str, part_numbers) -> SpoolFile:
+        """
+        Concatenate parts in the given order into a new spool file, ready to commit.
+        """
+        spool = self.spool()
+        try:
+            for part_number in part_numbers:
+                with open(self.part_path(upload_id, part_number), "rb") as part:
+                    while True:
+                        chunk = part.read(self.CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        spool.write(chunk)
+        except BaseException:
+            self.discard(spool)
+            raise
+        spool.flush()
+        return spool
+
+    def discard_upload(self, upload_id: str):
+        shutil.rmtree(os.path.join(self.uploads_dir, upload_id), ignore_errors=True)
@@ -0,0 +1,184 @@
+import base64
+import hashlib
+import math
+
+
+class ExactCounter:
+    """
+    Distinct-item counter backed by a set. Exact, but memory grows with the
+    number of distinct items.
+    """
+
+    __slots__ = ("_items",)
+
+    error_bound = 0.0
+
+    def __init__(self):
+        self._items = set()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, item: str):
+        self._items.add(item)
+
+    def merge(self, other: "ExactCounter"):
+        self._items |= other._items
+
+    def to_state(self) -> list:
+        return list(self._items)
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct-item estimator with 2**precision registers.
+
+    The relative standard error is 1.04 / sqrt(2**precision): about 1.6% at
+    the default precision of 12, for at most 4 KiB per counter. Small counters
+    keep only their non-zero registers in a dict and switch to a dense
+    bytearray once that stops being smaller. Counters of the same precision
+    merge by taking the register-wise maximum, so totals across many files
+    cost O(registers) per file regardless of how many items each has seen.
+    """
+
+    __slots__ = ("precision", "_sparse", "_registers")
+
+    def __init__(self, precision: int = 12):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self._sparse = {}  # register index -> rank, until converted to dense
+        self._registers = None
+
+    @property
+    def error_bound(self) -> float:
+        return 1.04 / math.sqrt(1 << self.precision)
+
+    def add(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=8).digest()
+        value = int.from_bytes(digest, "big")
+        width = 64 - self.precision
+        index = value >> width
+        rest = value & ((1 << width) - 1)
+        rank = width - rest.bit_length() + 1
+        self._set(index, rank)
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError("cannot merge HyperLogLogs of different precision")
+        if other._registers is None:
+            for index, rank in other._sparse.items():
+                self._set(index, rank)
+            return
+        self._densify()
+        self._registers = bytearray(map(max, self._registers, other._registers))
+
+    def folded(self, precision: int) -> "HyperLogLog":
+        """
+        A copy with fewer registers, exactly as if the same items had been
+        added at ``precision`` (at most this one's).
+        """
+        shift = self.precision - precision
+        if shift < 0:
+            raise ValueError("cannot fold a HyperLogLog to a higher precision")
+        folded = HyperLogLog(precision)
+        low_mask = (1 << shift) - 1
+        ranks = enumerate(self._registers) if self._sparse is None else self._sparse.items()
+        for index, rank in ranks:
+            if rank:
+                # The index bits dropped become the leading bits of the rest
+                low = index & low_mask
+                folded._set(index >> shift, shift - low.bit_length() + 1 if low else rank + shift)
+        return folded
+
+    def to_state(self) -> dict:
+        if self._registers is None:
+            return {"precision": self.precision, "sparse": list(self._sparse.items())}
+        registers = base64.b64encode(self._registers).decode()
+        return {"precision": self.precision, "registers": registers}
+
+    def __len__(self) -> int:
+        m = 1 << self.precision
+        if self._registers is None:
+            ranks = self._sparse.values()
+            zeros = m - len(self._sparse)
+        else:
+            ranks = self._registers
+            zeros = self._registers.count(0)
+        harmonic = zeros + sum(2.0**-rank for rank in ranks if rank)
+        estimate = _alpha(m) * m * m / harmonic
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def _set(self, index: int, rank: int):
+        if self._registers is not None:
+            if rank > self._registers[index]:
+                self._registers[index] = rank
+            return
+        if rank > self._sparse.get(index, 0):
+            self._sparse[index] = rank
+            if len(self._sparse) > (1 << self.precision) // 32:
+                self._densify()
+
+    def _densify(self):
+        if self._registers is not None:
+            return
+        self._registers = bytearray(1 << self.precision)
+        for index, rank in self._sparse.items():
+            self._registers[index] = rank
+        self._sparse = None
+
+
+def merge_counters(total, other):
+    """
+    Merge ``other`` into ``total`` and return the result, which is a new
+    counter when the two differ in kind: counters restored from before a
+    change of counting mode or precision can still be combined. Exact
+    counters are added into a HyperLogLog, and HyperLogLogs are folded to
+    the lower of their precisions.
+    """
+    if isinstance(total, ExactCounter):
+        if isinstance(other, ExactCounter):
+            total.merge(other)
+            return total
+        total, other = other.folded(other.precision), total
+    if isinstance(other, ExactCounter):
+        for item in other._items:
+            total.add(item)
+        return total
+    if other.precision > total.precision:
+        other = other.folded(total.precision)
+    elif other.precision < total.precision:
+        total = total.folded(other.precision)
+    total.merge(other)
+    return total
+
+
+def counter_from_state(state):
+    """
+    Rebuild a counter from its to_state(): a list for ExactCounter, a dict
+    for HyperLogLog.
+    """
+    if isinstance(state, list):
+        counter = ExactCounter()
+        counter._items.update(state)
+        return counter
+    counter = HyperLogLog(state["precision"])
+    if "registers" in state:
+        counter._sparse = None
+        counter._registers = bytearray(base64.b64decode(state["registers"]))
+    else:
+        counter._sparse = dict(state["sparse"])
+    return counter
+
+
+def _alpha(m: int) -> float:
+    if m == 16:
+        return 0.673
+    if m == 32:
+        return 0.697
+    if m == 64:
+        return 0.709
+    return 0.7213 / (1 + 1.079 / m)
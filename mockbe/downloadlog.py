@@ -0,0 +1,128 @@
+import uuid
+from array import array
+from bisect import bisect_left
+
+
+class DownloadLog:
+    """
+    Append-only download history of one file, stored as parallel columns:
+    epoch timestamps in an array('d') and downloader UserRecord references
+    (or None for anonymous downloads).
+
+    Appends are O(1) amortized. Entries fall off the front once the log holds
+    more than ``max_entries`` or they are older than ``max_age`` seconds
+    (either limit disabled when falsy). Every entry keeps a sequence number
+    for its whole life, so newest-first pages are found by index arithmetic
+    and cursors stay valid while the log grows or is trimmed.
+    """
+
+    __slots__ = (
+        "file_id",
+        "max_entries",
+        "max_age",
+        "_times",
+        "_downloaders",
+        "_start",
+        "_first_seq",
+    )
+
+    def __init__(self, file_id: str, max_entries: int = 0, max_age: float = 0):
+        self.file_id = file_id
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._times = array("d")
+        self._downloaders = []
+        self._start = 0  # column index of the oldest retained entry
+        self._first_seq = 0  # sequence number of that entry
+
+    def __len__(self) -> int:
+        return len(self._times) - self._start
+
+    def append(self, downloaded_at: float, downloader):
+        self._times.append(downloaded_at)
+        self._downloaders.append(downloader)
+        if self.max_entries and len(self) > self.max_entries:
+            self._drop(len(self) - self.max_entries)
+
+    def expire(self, now: float):
+        """
+        Drop entries older than max_age. Timestamps are appended in order,
+        so the cut-off is found by bisection.
+        """
+        if not self.max_age:
+            return
+        cut = bisect_left(self._times, now - self.max_age, self._start)
+        if cut > self._start:
+            self._drop(cut - self._start)
+
+    def position_after(self, seq: int) -> int:
+        """
+        Newest-first position of the entry just older than sequence ``seq``.
+        """
+        return max(0, self._first_seq + len(self) - seq)
+
+    def newest_first(self, start: int, stop: int):
+        """
+        Yield (seq, downloaded_at, downloader) for newest-first positions
+        [start, stop) without copying the columns.
+        """
+        count = len(self)
+        last = self._start + count - 1
+        for position in range(max(0, start), min(stop, count)):
+            index = last - position
+            yield (
+                self._first_seq + index - self._start,
+                self._times[index],
+                self._downloaders[index],
+            )
+
+    def oldest_first(self, seq: int = 0, since: float = None, limit: int = None):
+        """
+        Yield (seq, downloaded_at, downloader) oldest first, from sequence
+        ``seq`` or the first entry at or after ``since`` (whichever is
+        later), at most ``limit`` entries.
+        """
+        index = self._start + max(0, seq - self._first_seq)
+        if since is not None:
+            index = max(index, bisect_left(self._times, since, self._start))
+        stop = len(self._times) if limit is None else min(len(self._times), index + limit)
+        for i in range(index, stop):
+            yield (
+                self._first_seq + i - self._start,
+                self._times[i],
+                self._downloaders[i],
+            )
+
+    def to_state(self) -> list:
+        """
+        [first_seq, [timestamps], [downloader email or None]] of retained entries.
+        """
+        downloaders = self._downloaders[self._start :]
+        return [
+            self._first_seq,
+            self._times[self._start :].tolist(),
+            [user.email if user else None for user in downloaders],
+        ]
+
+    def restore(self, state: list, users: dict):
+        """
+        Replace the contents with a to_state() list; ``users`` maps email -> UserRecord.
+        """
+        first_seq, times, emails = state
+        self._times = array("d", times)
+        self._downloaders = [users.get(email) if email else None for email in emails]
+        self._start = 0
+        self._first_seq = first_seq
+
+    def entry_id(self, seq: int) -> str:
+        # Derived instead of stored: stable per (file, seq) and uuid-shaped
+        return str(uuid.uuid5(uuid.UUID(self.file_id), str(seq)))
+
+    def _drop(self, count: int):
+        self._start += count
+        self._first_seq += count
+        # Reclaim the dead prefix once it is at least half the columns
+        if self._start * 2 >= len(self._times):
+            del self._times[: self._start]
+            del self._downloaders[: self._start]
+            self._start = 0
@@ -0,0 +1,15 @@
+# gunicorn settings for the backend: gunicorn --config gunicorn.conf.py server:app
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+
+# Users, sessions, files and stats live in the server process's memory (and
+# its journal, see STATE_BACKEND), so more worker processes would each see
+# a different copy of the state. Concurrency comes from threads inside one
+# worker instead; server.py guards the shared state with locks.
+workers = 1
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", 16))
+
+# Large uploads and downloads stream through the worker threads
+timeout = int(os.environ.get("WEB_TIMEOUT_SECONDS", 120))
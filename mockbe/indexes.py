@@ -0,0 +1,289 @@
+import heapq
+from bisect import bisect_left, bisect_right, insort
+
+
+class OwnerIndex:
+    """
+    Secondary index owner email -> file ids, kept sorted two ways so a
+    user's listing never has to scan or sort the global files dict.
+
+    by_created[email] = sorted [(createdAt, file_id)]
+    by_name[email]    = sorted [(filename.lower(), file_id)]
+
+    Anonymous uploads are indexed under None, so walking every owner
+    visits every file.
+    """
+
+    def __init__(self):
+        self.by_created = {}
+        self.by_name = {}
+
+    def add(self, file_meta):
+        owner = file_meta.owner_email
+        insort(
+            self.by_created.setdefault(owner, []),
+            (file_meta.created_at, file_meta.id),
+        )
+        insort(
+            self.by_name.setdefault(owner, []),
+            (file_meta.filename.lower(), file_meta.id),
+        )
+
+    def remove(self, file_meta):
+        owner = file_meta.owner_email
+        if owner not in self.by_created:
+            return
+        _remove_sorted(self.by_created[owner], (file_meta.created_at, file_meta.id))
+        _remove_sorted(self.by_name[owner], (file_meta.filename.lower(), file_meta.id))
+        if not self.by_created[owner]:
+            del self.by_created[owner]
+            del self.by_name[owner]
+
+    def count(self, owner: str) -> int:
+        return len(self.by_created.get(owner, ()))
+
+    @staticmethod
+    def sort_key(file_meta, sort_by: str = "createdAt") -> tuple:
+        """
+        The (sort key, file_id) entry a file has in the given ordering.
+        """
+        if sort_by == "fileName":
+            return (file_meta.filename.lower(), file_meta.id)
+        return (file_meta.created_at, file_meta.id)
+
+    def ordered_ids(
+        self, owner: str, sort_by: str = "createdAt", reverse=False, after=None, skip: int = 0
+    ):
+        """
+        Iterate the owner's file ids in createdAt or fileName order, resuming
+        after the (sort key, file_id) entry ``after`` when given, then
+        skipping ``skip`` ids without visiting them.
+        """
+        index = self.by_name if sort_by == "fileName" else self.by_created
+        entries = index.get(owner, [])
+        return (file_id for _, file_id in iter_sorted(entries, after, reverse, skip))
+
+
+class FileSchedule:
+    """
+    Time-ordered index of availableFrom / availableTo (epoch seconds).
+
+    Two min-heaps hold the next transition of every file: pending -> active
+    when availableFrom is reached, and -> expired once availableTo has passed.
+    advance(now) pops only the boundaries that have been crossed, so finding
+    expired files or a file's status never re-parses or scans the store.
+    Removed files are dropped lazily from the heaps.
+
+    ``on_transition(file_id, old_status, new_status)``, when given, is called
+    for every transition applied, whichever caller advanced the schedule.
+    """
+
+    def __init__(self, on_transition=None):
+        self.on_transition = on_transition
+        self._starts = []  # heap of (availableFrom, file_id) for pending files
+        self._ends = []  # heap of (availableTo, file_id) for files not yet expired
+        self._windows = {}  # file_id -> (availableFrom, availableTo)
+        self._stale = 0
+        self.pending = set()
+        self.expired = set()
+
+    def __contains__(self, file_id: str) -> bool:
+        return file_id in self._windows
+
+    def add(self, file_id: str, available_from: float, available_to: float, now: float):
+        self._windows[file_id] = (available_from, available_to)
+        if now < available_from:
+            self.pending.add(file_id)
+            heapq.heappush(self._starts, (available_from, file_id))
+        if now > available_to:
+            self.expired.add(file_id)
+        else:
+            heapq.heappush(self._ends, (available_to, file_id))
+
+    def remove(self, file_id: str) -> str | None:
+        """
+        Forget a file. Returns the status it had as of the last advance(),
+        or None if it was not scheduled.
+        """
+        if self._windows.pop(file_id, None) is None:
+            return None
+        status = self._current_status(file_id)
+        self.pending.discard(file_id)
+        self.expired.discard(file_id)
+        self._stale += 1
+        if self._stale > len(self._windows) + 1024:
+            self._compact()
+        return status
+
+    def advance(self, now: float) -> list:
+        """
+        Apply every transition due by ``now``.
+        Returns [(file_id, old_status, new_status)] in time order per heap.
+        """
+        transitions = []
+        starts = self._starts
+        while starts and starts[0][0] <= now:
+            available_from, file_id = heapq.heappop(starts)
+            if file_id in self.pending and self._windows[file_id][0] == available_from:
+                self.pending.discard(file_id)
+                transitions.append((file_id, "pending", "active"))
+
+        ends = self._ends
+        while ends and ends[0][0] < now:
+            available_to, file_id = heapq.heappop(ends)
+            window = self._windows.get(file_id)
+            if window is None or window[1] != available_to:
+                continue
+            old_status = "pending" if file_id in self.pending else "active"
+            self.pending.discard(file_id)
+            self.expired.add(file_id)
+            transitions.append((file_id, old_status, "expired"))
+
+        if self.on_transition is not None:
+            for transition in transitions:
+                self.on_transition(*transition)
+        return transitions
+
+    def status(self, file_id: str, now: float) -> str:
+        self.advance(now)
+        return self._current_status(file_id)
+
+    def _current_status(self, file_id: str) -> str:
+        if file_id in self.expired:
+            return "expired"
+        if file_id in self.pending:
+            return "pending"
+        return "active"
+
+    def _compact(self):
+        self._starts = [
+            (t, fid) for t, fid in self._starts if fid in self.pending
+        ]
+        self._ends = [
+            (t, fid)
+            for t, fid in self._ends
+            if fid in self._windows and fid not in self.expired
+        ]
+        heapq.heapify(self._starts)
+        heapq.heapify(self._ends)
+        self._stale = 0
+
+
+class PublicFileIndex:
+    """
+    createdAt-ordered [(createdAt, file_id)] of the files listed by
+    GET /api/files/available: public, not restricted to a sharedWith list,
+    and currently active.
+
+    Listable files are registered once; they enter and leave ``entries``
+    through FileSchedule transitions (wire on_transition to the schedule),
+    so serving a page never scans or sorts the store.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self._listable = {}  # file_id -> createdAt for public, unrestricted files
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, file_meta, status: str):
+        if not file_meta.is_public or file_meta.shared_with:
+            return
+        self._listable[file_meta.id] = file_meta.created_at
+        if status == "active":
+            insort(self.entries, (file_meta.created_at, file_meta.id))
+
+    def remove(self, file_id: str):
+        created_at = self._listable.pop(file_id, None)
+        if created_at is not None:
+            _remove_sorted(self.entries, (created_at, file_id))
+
+    def on_transition(self, file_id: str, old_status: str, new_status: str):
+        created_at = self._listable.get(file_id)
+        if created_at is None:
+            return
+        if new_status == "active":
+            insort(self.entries, (created_at, file_id))
+        elif old_status == "active":
+            _remove_sorted(self.entries, (created_at, file_id))
+
+
+class StatusCounters:
+    """
+    File counts by status, per owner email (None for anonymous uploads) and
+    in total. pending / active / expired count the stored files, deleted
+    counts the files removed so far.
+
+    Kept current by add() / remove() and by FileSchedule transitions (wire
+    on_transition to the schedule, resolving the file's owner), so reading
+    a summary never looks at the files. Only the deleted counts are not
+    derived from the stored files, and they are saved with to_state().
+    """
+
+    def __init__(self):
+        self.totals = _empty_counts()
+        self.by_owner = {}
+
+    def counts(self, owner: str | None) -> dict:
+        return dict(self.by_owner.get(owner) or _empty_counts())
+
+    def add(self, owner: str | None, status: str):
+        self._move(owner, None, status)
+
+    def remove(self, owner: str | None, status: str):
+        self._move(owner, status, "deleted")
+
+    def on_transition(self, owner: str | None, old_status: str, new_status: str):
+        self._move(owner, old_status, new_status)
+
+    def to_state(self) -> list:
+        """
+        [[owner, deleted count]] of the owners with deleted files.
+        """
+        return [
+            [owner, counts["deleted"]]
+            for owner, counts in self.by_owner.items()
+            if counts["deleted"]
+        ]
+
+    def restore(self, state: list):
+        for owner, deleted in state:
+            self._owner_counts(owner)["deleted"] += deleted
+            self.totals["deleted"] += deleted
+
+    def _owner_counts(self, owner: str | None) -> dict:
+        counts = self.by_owner.get(owner)
+        if counts is None:
+            counts = self.by_owner[owner] = _empty_counts()
+        return counts
+
+    def _move(self, owner: str | None, old_status: str | None, new_status: str):
+        for counts in (self._owner_counts(owner), self.totals):
+            if old_status is not None:
+                counts[old_status] -= 1
+            counts[new_status] += 1
+
+
+def _empty_counts() -> dict:
+    return {"pending": 0, "active": 0, "expired": 0, "deleted": 0}
+
+
+def iter_sorted(entries: list, after=None, reverse=False, skip: int = 0):
+    """
+    Iterate a sorted list of (key, id) tuples, ascending or descending,
+    starting strictly after ``after`` and then skipping ``skip`` entries.
+    Resuming costs one bisect however deep the position is, and entries
+    removed since ``after`` was handed out do not shift the remaining ones.
+    """
+    if reverse:
+        stop = len(entries) if after is None else bisect_left(entries, after)
+        return (entries[i] for i in range(stop - 1 - skip, -1, -1))
+    start = 0 if after is None else bisect_right(entries, after)
+    return (entries[i] for i in range(start + skip, len(entries)))
+
+
+def _remove_sorted(entries: list, entry):
+    i = bisect_left(entries, entry)
+    if i < len(entries) and entries[i] == entry:
+        del entries[i]
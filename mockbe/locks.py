@@ -0,0 +1,44 @@
+import functools
+import threading
+from contextlib import ExitStack, contextmanager
+
+
+class LockStripes:
+    """
+    A fixed set of locks shared by key hash, so that requests touching
+    different keys (files, upload sessions) rarely wait on each other while
+    the number of locks stays bounded no matter how many keys exist.
+    """
+
+    def __init__(self, count: int = 64):
+        self._locks = tuple(threading.Lock() for _ in range(count))
+
+    def __getitem__(self, key) -> threading.Lock:
+        return self._locks[hash(key) % len(self._locks)]
+
+    @contextmanager
+    def all(self):
+        """
+        Hold every stripe, always acquired in the same order, for work that
+        must see all keys at once (totals across files, snapshots).
+        """
+        with ExitStack() as stack:
+            for lock in self._locks:
+                stack.enter_context(lock)
+            yield
+
+
+def holding(lock):
+    """
+    Decorator running the whole function with ``lock`` held.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with lock:
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
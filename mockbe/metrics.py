@@ -0,0 +1,145 @@
+import json
+import threading
+from bisect import bisect_left
+
+# Upper bounds of the latency histogram buckets in seconds; +Inf is implied
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Metrics:
+    """
+    Counters and histograms recorded from request threads without locking.
+
+    Each thread writes only to its own shard, created on its first record
+    (the only time a lock is taken). A scrape copies and merges every
+    shard. Since a shard has a single writer, nothing is ever lost: an
+    increment racing with a scrape just shows up in the next one.
+
+    Metric names are declared with describe(); labels are tuples of
+    (name, value) pairs. Gauges are not recorded here but computed by the
+    caller at scrape time and passed to collect().
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.descriptions = {}  # name -> (type, help)
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self.descriptions[name] = (kind, help_text)
+
+    def inc(self, name: str, labels: tuple = (), value: float = 1):
+        counters = self._shard()[0]
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: tuple, value: float):
+        histograms = self._shard()[1]
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            # One count per bucket, then +Inf, then the sum of observations
+            histogram = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        histogram[bisect_left(self.buckets, value)] += 1
+        histogram[-1] += value
+
+    def collect(self, gauges: dict = None) -> list:
+        """
+        Merge all shards. Returns [(name, type, help, samples)] sorted by
+        name, where samples maps labels to a value (counters, gauges) or to
+        (cumulative bucket counts, sum) (histograms). ``gauges`` maps
+        (name, labels) to the current value.
+        """
+        with self._lock:
+            shards = list(self._shards)
+
+        counters = {}
+        histograms = {}
+        for shard_counters, shard_histograms in shards:
+            for key, value in list(shard_counters.items()):
+                counters[key] = counters.get(key, 0) + value
+            for key, histogram in list(shard_histograms.items()):
+                merged = histograms.get(key)
+                if merged is None:
+                    histograms[key] = list(histogram)
+                else:
+                    histograms[key] = [a + b for a, b in zip(merged, histogram)]
+
+        samples = {}
+        for (name, labels), value in list(counters.items()) + list((gauges or {}).items()):
+            samples.setdefault(name, {})[labels] = value
+        for (name, labels), histogram in histograms.items():
+            cumulative = []
+            total = 0
+            for count in histogram[:-1]:
+                total += count
+                cumulative.append(total)
+            samples.setdefault(name, {})[labels] = (cumulative, histogram[-1])
+
+        families = []
+        for name in sorted(samples):
+            kind, help_text = self.descriptions.get(name, ("untyped", ""))
+            families.append((name, kind, help_text, samples[name]))
+        return families
+
+    def to_prometheus(self, gauges: dict = None) -> str:
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        bounds = [str(b) for b in self.buckets] + ["+Inf"]
+        lines = []
+        for name, kind, help_text, samples in self.collect(gauges):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(samples.items()):
+                if kind != "histogram":
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+                    continue
+                cumulative, total = value
+                for bound, count in zip(bounds, cumulative):
+                    lines.append(
+                        f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}"
+                    )
+                lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self, gauges: dict = None) -> dict:
+        bounds = [str(b) for b in self.buckets] + ["+Inf"]
+        result = {}
+        for name, kind, help_text, samples in self.collect(gauges):
+            entries = []
+            for labels, value in sorted(samples.items()):
+                entry = {"labels": dict(labels)}
+                if kind == "histogram":
+                    cumulative, total = value
+                    entry["buckets"] = dict(zip(bounds, cumulative))
+                    entry["sum"] = total
+                    entry["count"] = cumulative[-1]
+                else:
+                    entry["value"] = value
+                entries.append(entry)
+            result[name] = {"type": kind, "help": help_text, "samples": entries}
+        return result
+
+    def _shard(self) -> tuple:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = ({}, {})
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f"{key}={json.dumps(str(value), ensure_ascii=False)}" for key, value in labels
+    )
+    return "{" + pairs + "}"
+
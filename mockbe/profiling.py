@@ -0,0 +1,110 @@
+import cProfile
+import marshal
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+# cProfile hooks the interpreter, so only one request is profiled with it at
+# a time; later ones fall back to not being profiled
+_cprofile_lock = threading.Lock()
+
+
+class CProfileRecorder:
+    """
+    Deterministic profile of the calling thread, saved in pstats format.
+    """
+
+    mode = "cprofile"
+
+    def __init__(self):
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+
+    def stop(self) -> bytes:
+        self._profiler.disable()
+        _cprofile_lock.release()
+        self._profiler.create_stats()
+        # Same layout as pstats.Stats.dump_stats(), loadable by pstats/snakeviz
+        return marshal.dumps(self._profiler.stats)
+
+
+class StackSampler:
+    """
+    Statistical profile of one thread: a helper thread records its stack
+    every ``interval`` seconds. Saved as collapsed stacks ("a;b;c count"
+    per line), the input format of flamegraph.pl and speedscope.
+    """
+
+    mode = "sample"
+
+    def __init__(self, thread_id: int = None, interval: float = 0.001):
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> bytes:
+        self._stopped.set()
+        self._thread.join()
+        lines = [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+        return ("\n".join(lines) + "\n").encode()
+
+    def _run(self):
+        while True:
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names)).replace(" ", "_")] += 1
+            if self._stopped.wait(self.interval):
+                return
+
+
+def start_profile(mode: str):
+    """
+    Start profiling the calling thread. Returns a recorder whose stop()
+    returns the profile data, or None if ``mode`` is unknown or cProfile is
+    already busy with another request.
+    """
+    if mode == "sample":
+        return StackSampler()
+    if mode == "cprofile" and _cprofile_lock.acquire(blocking=False):
+        try:
+            return CProfileRecorder()
+        except BaseException:
+            _cprofile_lock.release()
+            raise
+    return None
+
+
+class RingLog:
+    """
+    The last ``size`` entries added, safe to add to and read from any thread.
+    """
+
+    def __init__(self, size: int):
+        self._entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, entry: dict) -> dict:
+        entry.setdefault("id", uuid.uuid4().hex[:12])
+        entry.setdefault("at", time.time())
+        with self._lock:
+            self._entries.append(entry)
+        return entry
+
+    def get(self, entry_id: str) -> dict | None:
+        with self._lock:
+            return next((e for e in self._entries if e["id"] == entry_id), None)
+
+    def newest_first(self) -> list:
+        with self._lock:
+            return list(reversed(self._entries))
@@ -0,0 +1,200 @@
+from datetime import datetime, timezone
+from itertools import count
+
+from counters import counter_from_state
+
+# Compact records for the in-memory store. Slotted classes avoid a per-record
+# __dict__, and a file points at its owner's UserRecord instead of holding a
+# copy. Timestamps (availableFrom, availableTo, createdAt, lastDownloadedAt)
+# are epoch seconds and only formatted as ISO 8601 when serialized.
+#
+# to_state() / from_state() convert a record to and from the JSON list (fields
+# in __slots__ order) kept by the durable storage backend (see storage.py).
+
+# Source of FileRecord.version, unique across all records of this process
+_file_versions = count(1)
+
+
+class UserRecord:
+    __slots__ = (
+        "id",
+        "username",
+        "email",
+        "password",
+        "role",
+        "totp_enabled",
+        "totp_secret",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        username: str,
+        email: str,
+        password: str,
+        role: str = "user",
+        totp_enabled: bool = False,
+        totp_secret: str | None = None,
+    ):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.password = password
+        self.role = role
+        self.totp_enabled = totp_enabled
+        self.totp_secret = totp_secret
+
+    def to_state(self) -> list:
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_state(cls, state: list) -> "UserRecord":
+        return cls(*state)
+
+
+class FileRecord:
+    """
+    shareToken is the file id and shareLink is derived from it, so neither is stored.
+
+    ``version`` identifies this state of the record for ETags: it is drawn
+    when the record is built, and records are never changed in place, so a
+    different state is always a different version. It is not persisted, so
+    it is only meaningful within one process.
+    """
+
+    __slots__ = (
+        "id",
+        "filename",
+        "size",
+        "mime_type",
+        "owner",
+        "is_public",
+        "password",
+        "available_from",
+        "available_to",
+        "shared_with",
+        "created_at",
+        "sha256",
+        "version",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        filename: str,
+        size: int,
+        mime_type: str,
+        owner: UserRecord | None,
+        is_public: bool,
+        password: str | None,
+        available_from: float | None,
+        available_to: float | None,
+        shared_with: tuple,
+        created_at: float,
+        sha256: str,
+    ):
+        self.id = id
+        self.filename = filename
+        self.size = size
+        self.mime_type = mime_type
+        self.owner = owner
+        self.is_public = is_public
+        self.password = password
+        self.available_from = available_from
+        self.available_to = available_to
+        self.shared_with = shared_with
+        self.created_at = created_at
+        self.sha256 = sha256
+        self.version = next(_file_versions)
+
+    def to_state(self) -> list:
+        state = [getattr(self, name) for name in self.__slots__[:-1]]
+        state[4] = self.owner_email
+        state[9] = list(self.shared_with)
+        return state
+
+    @classmethod
+    def from_state(cls, state: list, users: dict) -> "FileRecord":
+        """
+        ``users`` maps email -> UserRecord and resolves the stored owner email.
+        """
+        file_meta = cls(*state)
+        file_meta.owner = users.get(state[4]) if state[4] else None
+        file_meta.shared_with = tuple(state[9])
+        return file_meta
+
+    @property
+    def share_token(self) -> str:
+        return self.id
+
+    @property
+    def owner_email(self) -> str | None:
+        return self.owner.email if self.owner else None
+
+    @property
+    def password_protected(self) -> bool:
+        return bool(self.password)
+
+
+class FileStats:
+    """
+    unique_downloaders is a distinct counter from counters.py (exact set or
+    HyperLogLog); only its len() is reported.
+    """
+
+    __slots__ = ("download_count", "unique_downloaders", "last_downloaded_at")
+
+    def __init__(self, unique_downloaders):
+        self.download_count = 0
+        self.unique_downloaders = unique_downloaders
+        self.last_downloaded_at = None
+
+    def to_state(self) -> list:
+        return [
+            self.download_count,
+            self.unique_downloaders.to_state(),
+            self.last_downloaded_at,
+        ]
+
+    @classmethod
+    def from_state(cls, state: list) -> "FileStats":
+        stats = cls(counter_from_state(state[1]))
+        stats.download_count = state[0]
+        stats.last_downloaded_at = state[2]
+        return stats
+
+
+def to_epoch(value: datetime) -> float:
+    return value.timestamp()
+
+
+def to_iso(ts: float | None) -> str | None:
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def classify_status(available_from: float | None, available_to: float | None, now: float) -> str:
+    if available_from is not None and now < available_from:
+        return "pending"
+    if available_to is not None and now > available_to:
+        return "expired"
+    return "active"
+
+
+def classify_statuses(file_metas, now: float) -> list:
+    """
+    Status of many records against a single ``now``.
+    """
+    statuses = []
+    append = statuses.append
+    for file_meta in file_metas:
+        available_from = file_meta.available_from
+        available_to = file_meta.available_to
+        if available_from is not None and now < available_from:
+            append("pending")
+        elif available_to is not None and now > available_to:
+            append("expired")
+        else:
+            append("active")
+    return statuses
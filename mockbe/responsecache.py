@@ -0,0 +1,47 @@
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    key -> serialized response body, each stored with the ETag it was built
+    for. A lookup only hits if the caller's current ETag is the stored one,
+    so bumping a version (or anything else the ETag is derived from) is
+    enough to invalidate; the stale entry is replaced on the next put.
+
+    Past ``max_entries`` (0 disables the limit) the least recently used
+    entry is evicted. Every method holds an internal lock, so one cache can
+    be shared by request threads.
+    """
+
+    def __init__(self, max_entries: int = 0):
+        self.max_entries = max_entries
+        # key -> (etag, body), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key, etag: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, etag: str, body: bytes):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (etag, body)
+            if self.max_entries:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evicted += 1
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
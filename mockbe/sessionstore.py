@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class SessionStore:
+    """
+    token -> value map (the value is the user's email) with:
+
+      ttl          absolute lifetime from creation, in seconds
+      idle_ttl     lifetime since the token was last used, in seconds
+      max_entries  capacity; the least recently used token is evicted past it
+
+    Each limit is disabled when falsy. Reads check the entry they touch
+    (lazy expiry) and move it to the most-recently-used end, both O(1). At
+    most every ``sweep_interval`` seconds a read or write also sweeps
+    expired entries. Entries are kept in last-use order and creation times
+    in a separate creation-ordered queue, so a sweep stops at the first
+    live entry instead of scanning the store. Evictions, logouts and idle
+    expiry leave their tokens in that queue; it is rebuilt from the live
+    entries once it holds twice as many, so it stays proportional to the
+    store rather than to the login rate.
+
+    Every method holds an internal lock, so one store can be shared by
+    request threads.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 0,
+        idle_ttl: float = 0,
+        max_entries: int = 0,
+        sweep_interval: float = 60,
+        clock=time.time,
+    ):
+        self.ttl = ttl
+        self.idle_ttl = idle_ttl
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+
+        # token -> [value, created_at, last_used_at], least recently used first
+        self._entries = OrderedDict()
+        # (created_at, token) in creation order, for the absolute TTL
+        self._created = deque()
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, token: str) -> bool:
+        return self.get(token) is not None
+
+    def __setitem__(self, token: str, value):
+        self.set(token, value)
+
+    def __delitem__(self, token: str):
+        with self._lock:
+            del self._entries[token]
+
+    def set(self, token: str, value, created_at: float = None, last_used_at: float = None):
+        """
+        Add or replace a token. ``created_at`` / ``last_used_at`` are only
+        passed when restoring saved sessions; they default to now.
+        """
+        now = self.clock()
+        created_at = now if created_at is None else created_at
+        last_used_at = created_at if last_used_at is None else last_used_at
+
+        with self._lock:
+            self._entries.pop(token, None)
+            self._entries[token] = [value, created_at, last_used_at]
+            if self.ttl:
+                self._created.append((created_at, token))
+            self.created += 1
+
+            if self.max_entries:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evicted += 1
+            if len(self._created) > 2 * len(self._entries):
+                self._compact_created()
+            self._maybe_sweep(now)
+
+    def get(self, token: str, default=None):
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return default
+
+            if self._is_expired(entry, now):
+                del self._entries[token]
+                self.expired += 1
+                return default
+
+            entry[2] = now
+            self._entries.move_to_end(token)
+            self._maybe_sweep(now)
+            return entry[0]
+
+    def pop(self, token: str, default=None):
+        with self._lock:
+            entry = self._entries.pop(token, None)
+        return default if entry is None else entry[0]
+
+    def sweep(self, now: float = None) -> int:
+        """
+        Remove every expired entry. Returns how many were removed.
+        """
+        now = self.clock() if now is None else now
+        with self._lock:
+            return self._sweep(now)
+
+    def _sweep(self, now: float) -> int:
+        self._next_sweep = now + self.sweep_interval
+        removed = 0
+
+        entries = self._entries
+        if self.idle_ttl:
+            while entries:
+                token, entry = next(iter(entries.items()))
+                if now - entry[2] <= self.idle_ttl:
+                    break
+                del entries[token]
+                removed += 1
+
+        if self.ttl:
+            created = self._created
+            while created and now - created[0][0] > self.ttl:
+                created_at, token = created.popleft()
+                entry = entries.get(token)
+                # Skip tokens already removed or re-created since
+                if entry is not None and entry[1] == created_at:
+                    del entries[token]
+                    removed += 1
+
+        self.expired += removed
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "live": len(self._entries),
+                "created": self.created,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+    def to_state(self) -> list:
+        """
+        [[token, value, created_at, last_used_at]] in least-recently-used order.
+        """
+        with self._lock:
+            return [[token, *entry] for token, entry in self._entries.items()]
+
+    def restore(self, state: list):
+        """
+        Load a to_state() list, keeping its last-use order; entries that
+        expired in the meantime are dropped by the sweep at the end.
+        """
+        with self._lock:
+            for token, value, created_at, last_used_at in state:
+                self._entries[token] = [value, created_at, last_used_at]
+            if self.ttl:
+                self._created.extend(
+                    sorted((entry[1], token) for token, entry in self._entries.items())
+                )
+            self._sweep(self.clock())
+            while self.max_entries and len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def _compact_created(self):
+        # Drop queued tokens that were removed or re-created since, keeping
+        # creation order
+        entries = self._entries
+        self._created = deque(
+            item
+            for item in self._created
+            if (entry := entries.get(item[1])) is not None and entry[1] == item[0]
+        )
+
+    def _is_expired(self, entry: list, now: float) -> bool:
+        if self.ttl and now - entry[1] > self.ttl:
+            return True
+        return bool(self.idle_ttl) and now - entry[2] > self.idle_ttl
+
+    def _maybe_sweep(self, now: float):
+        if now >= self._next_sweep:
+            self._sweep(now)
@@ -0,0 +1,223 @@
+import json
+import os
+import threading
+
+
+class MemoryStorage:
+    """
+    Keeps nothing: state lives only in the server's in-memory dicts and is
+    lost on restart. This is the default backend.
+    """
+
+    def load(self):
+        return None, iter(())
+
+    def append(self, op: str, data):
+        pass
+
+    def needs_snapshot(self) -> bool:
+        return False
+
+    def begin_snapshot(self) -> int:
+        return 0
+
+    def write_snapshot(self, state: dict, seq: int = None):
+        pass
+
+    def write_snapshot_in_background(self, state: dict, seq: int):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class JournalStorage:
+    """
+    Durable backend: a write-ahead log of state changes plus a compacted
+    snapshot of the full state.
+
+    Layout under ``directory``:
+      snapshot.json   full state as of the last compaction, with its WAL seq
+      wal.log         one JSON line [seq, op, data] per change since then
+
+    append() only buffers the line. A background thread writes the buffer and
+    fsyncs every ``commit_interval`` seconds (group commit), so no request
+    waits on the disk; a crash loses at most the last interval. Snapshots are
+    written to a temp file and renamed into place before the log is reset,
+    and replay skips log lines already covered by the snapshot's seq, so a
+    crash in the middle of a compaction never applies a change twice.
+
+    A compaction takes the seq first (begin_snapshot()), then the caller
+    copies its state and the copy is written out, in the background if need
+    be. Changes logged meanwhile are kept in the new log. A change logged
+    after the seq may also be in the copy; it is then replayed on top of the
+    snapshot, which must be harmless (setting or popping a session, say).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        commit_interval: float = 0.05,
+        snapshot_every: int = 100_000,
+    ):
+        self.directory = directory
+        self.commit_interval = commit_interval
+        self.snapshot_every = snapshot_every
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        self.wal_path = os.path.join(directory, "wal.log")
+        os.makedirs(directory, exist_ok=True)
+
+        self._seq = 0  # seq of the last change appended
+        self._wal_records = 0  # changes in wal.log since the last snapshot
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wal = None
+        self._closed = threading.Event()
+        self._flusher = None
+        # Set from begin_snapshot() until the snapshot is written; the offset
+        # is where changes after the snapshot's seq start in wal.log
+        self._snapshotting = False
+        self._snapshot_offset = 0
+        self._snapshot_writer = None
+
+    def load(self):
+        """
+        Returns (snapshot state or None, iterator of (op, data) to replay on top).
+        Must be called once, before the first append().
+        """
+        state = None
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding="utf-8") as fh:
+                snapshot = json.load(fh)
+            snapshot_seq = snapshot["seq"]
+            state = snapshot["state"]
+        self._seq = snapshot_seq
+        return state, self._replay(snapshot_seq)
+
+    def _replay(self, snapshot_seq: int):
+        if os.path.exists(self.wal_path):
+            with open(self.wal_path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        seq, op, data = json.loads(line)
+                    except ValueError:
+                        # Torn last line from a crash mid-write
+                        break
+                    if seq <= snapshot_seq:
+                        continue
+                    self._seq = seq
+                    self._wal_records += 1
+                    yield op, data
+        self._open_wal()
+
+    def _open_wal(self):
+        self._wal = open(self.wal_path, "a", encoding="utf-8")
+        if self._flusher is None:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name="wal-flusher", daemon=True
+            )
+            self._flusher.start()
+
+    def append(self, op: str, data):
+        with self._lock:
+            self._seq += 1
+            self._wal_records += 1
+            self._buffer.append(
+                json.dumps([self._seq, op, data], separators=(",", ":")) + "\n"
+            )
+
+    def needs_snapshot(self) -> bool:
+        return not self._snapshotting and self._wal_records >= self.snapshot_every
+
+    def flush(self):
+        """
+        Write and fsync everything appended so far.
+        """
+        with self._io_lock:
+            self._flush_buffer()
+
+    def begin_snapshot(self) -> int:
+        """
+        Start a compaction. Returns the seq of the last change appended: the
+        state then passed to write_snapshot() must include every change up
+        to it. needs_snapshot() is False until that snapshot is written.
+        """
+        with self._io_lock:
+            with self._lock:
+                self._snapshotting = True
+                seq = self._seq
+            self._flush_buffer()
+            self._snapshot_offset = os.fstat(self._wal.fileno()).st_size
+        return seq
+
+    def write_snapshot(self, state: dict, seq: int = None):
+        """
+        Persist ``state`` as of ``seq`` (from begin_snapshot(); if not given,
+        ``state`` must include every change appended so far) and drop the
+        log lines it covers.
+        """
+        if seq is None:
+            seq = self.begin_snapshot()
+        try:
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump({"seq": seq, "state": state}, fh, separators=(",", ":"))
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            with self._io_lock:
+                self._flush_buffer()
+                # The new log starts with the changes appended since the seq
+                self._wal.close()
+                with open(self.wal_path, "rb") as wal:
+                    wal.seek(self._snapshot_offset)
+                    tail = wal.read()
+                tmp_path = self.wal_path + ".tmp"
+                with open(tmp_path, "wb") as fh:
+                    fh.write(tail)
+                    fh.flush()
+                    os.fsync(fh.fileno())
+                os.replace(tmp_path, self.wal_path)
+                self._wal = open(self.wal_path, "a", encoding="utf-8")
+                with self._lock:
+                    self._wal_records = self._seq - seq
+        finally:
+            self._snapshotting = False
+
+    def write_snapshot_in_background(self, state: dict, seq: int):
+        """
+        write_snapshot() on a separate thread; close() waits for it.
+        """
+        self._snapshot_writer = threading.Thread(
+            target=self.write_snapshot, args=(state, seq), name="snapshot-writer"
+        )
+        self._snapshot_writer.start()
+
+    def close(self):
+        if self._snapshot_writer is not None:
+            self._snapshot_writer.join()
+        self._closed.set()
+        self.flush()
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+
+    def _flush_buffer(self):
+        # Callers hold _io_lock
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if not lines or self._wal is None:
+            return
+        self._wal.write("".join(lines))
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.commit_interval):
+            self.flush()
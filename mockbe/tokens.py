@@ -0,0 +1,143 @@
+import base64
+import hashlib
+import heapq
+import hmac
+import json
+import threading
+import time
+import uuid
+
+
+class TokenSigner:
+    """
+    Stateless tokens any process holding the keys can check on its own:
+
+        <kid>.<payload>.<signature>
+
+    payload is the base64url JSON of the claims, signature the base64url
+    HMAC-SHA256 of "<kid>.<payload>" under the key named kid. Tokens are
+    signed with ``current``; every key in ``keys`` (kid -> secret) is
+    accepted, so a key is rotated by signing with a new one and keeping the
+    old one until the tokens it signed have expired.
+
+    Claims always carry ``typ`` (what the token is for), ``exp`` (expiry,
+    epoch seconds) and ``jti`` (a unique id, for revocation).
+    """
+
+    def __init__(self, keys: dict, current: str, clock=time.time):
+        if current not in keys:
+            raise ValueError(f"unknown signing key {current!r}")
+        # Keyed once; each signature starts from a copy
+        self.keys = {
+            kid: hmac.new(secret.encode(), digestmod=hashlib.sha256)
+            for kid, secret in keys.items()
+        }
+        self.current = current
+        self.clock = clock
+
+    def sign(self, typ: str, ttl: float, **claims) -> str:
+        claims.update(typ=typ, exp=int(self.clock() + ttl), jti=uuid.uuid4().hex)
+        payload = _b64encode(json.dumps(claims, separators=(",", ":"), sort_keys=True).encode())
+        signing_input = f"{self.current}.{payload}"
+        return f"{signing_input}.{self._signature(self.current, signing_input)}"
+
+    def verify(self, token: str, typ: str) -> dict | None:
+        """
+        The claims of a well-formed, correctly signed, unexpired token of
+        type ``typ``, else None.
+        """
+        try:
+            kid, payload, signature = token.split(".")
+        except ValueError:
+            return None
+        if kid not in self.keys:
+            return None
+        expected = self._signature(kid, f"{kid}.{payload}")
+        if not hmac.compare_digest(signature.encode(), expected.encode()):
+            return None
+        try:
+            # json.loads() of str skips the encoding detection bytes need
+            claims = json.loads(_b64decode(payload).decode())
+        except ValueError:
+            return None
+        if not isinstance(claims, dict) or claims.get("typ") != typ:
+            return None
+        if claims.get("exp", 0) < self.clock():
+            return None
+        return claims
+
+    def _signature(self, kid: str, signing_input: str) -> str:
+        mac = self.keys[kid].copy()
+        mac.update(signing_input.encode())
+        return _b64encode(mac.digest())
+
+
+def parse_signing_keys(value: str) -> tuple:
+    """
+    "kid:secret,kid:secret" -> (keys, current kid); the first key signs.
+    """
+    keys = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        kid, sep, secret = item.partition(":")
+        if not sep or not kid or not secret or "." in kid:
+            raise ValueError(f"signing keys must be kid:secret pairs, got {item!r}")
+        keys[kid] = secret
+    if not keys:
+        raise ValueError("no signing keys")
+    return keys, next(iter(keys))
+
+
+class RevocationList:
+    """
+    Ids (jti) of revoked tokens, each kept only until the token it revokes
+    would have expired anyway, so the list holds recent logouts rather than
+    every token ever issued. Safe to share between request threads.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._expiries = {}  # jti -> exp
+        self._heap = []  # (exp, jti)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._expiries)
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self._expiries
+
+    def revoke(self, jti: str, exp: float) -> bool:
+        """
+        Returns whether ``jti`` was newly revoked: False if it already was,
+        or if its token has expired anyway.
+        """
+        with self._lock:
+            self._prune()
+            if jti in self._expiries or exp < self.clock():
+                return False
+            self._expiries[jti] = exp
+            heapq.heappush(self._heap, (exp, jti))
+            return True
+
+    def to_state(self) -> list:
+        with self._lock:
+            return [[jti, exp] for jti, exp in self._expiries.items()]
+
+    def restore(self, state: list):
+        for jti, exp in state:
+            self.revoke(jti, exp)
+
+    def _prune(self):
+        now = self.clock()
+        heap = self._heap
+        while heap and heap[0][0] < now:
+            _, jti = heapq.heappop(heap)
+            self._expiries.pop(jti, None)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))